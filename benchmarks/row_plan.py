@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Micro-benchmark which compares the compiled row plan
+with the previous per-row dictionary loop of write_data"""
+
+import os
+import sys
+import time
+
+import click
+from influxdb.line_protocol import make_lines
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from csvimporter import CsvImporter, LineProtocolEncoder, RowPlan  # noqa: E402
+
+
+def generate_rows(rows_count, columns_count):
+    """Returns a header and rows with a tag, a timestamp and numeric columns"""
+    header = ["device", "timestamp"] + [
+        "value{index}".format(index=index) for index in range(columns_count)
+    ]
+    rows = [
+        ["device{index}".format(index=row % 10), str(1480550400 + row)]
+        + [str(row * column) for column in range(columns_count)]
+        for row in range(rows_count)
+    ]
+    return header, rows
+
+
+def legacy_loop(header, rows, tags_columns, ignorelist):
+    """Transforms all rows like write_data did before the row plan
+    including the line protocol serialization of the InfluxDB client"""
+    points = []
+    for values in rows:
+        row = dict(zip(header, values))
+        row_copy = row.copy()
+        for column in ignorelist:
+            del row_copy[column]
+        row_copy = CsvImporter.convert_int_to_float(row_copy, tags_columns)
+        tags = {}
+        for column in tags_columns:
+            if row_copy and column in row_copy:
+                if column == "" or row_copy[column] == "":
+                    del row_copy[column]
+                    continue
+                else:
+                    tags[column] = row_copy[column]
+                    del row_copy[column]
+        points.append({"measurement": "m", "fields": row_copy, "tags": tags})
+    return make_lines({"points": points})
+
+
+def row_plan(header, rows, tags_columns, ignorelist):
+    """Transforms all rows with the compiled row plan"""
+    plan = RowPlan(
+        header,
+        LineProtocolEncoder("m", tags_columns),
+        column_ignorelist=ignorelist,
+        convert_int_to_float=True,
+    )
+    return list(plan.transform(rows))
+
+
+@click.command()
+@click.option("--rows", default=100000, help="Number of rows (Default: 100000)")
+@click.option("--columns", default=20, help="Number of value columns (Default: 20)")
+@click.option("--repeat", default=3, help="Number of repetitions (Default: 3)")
+def cli(rows, columns, repeat):
+    """Micro-benchmark for the compiled row plan"""
+    header, csv_rows = generate_rows(rows, columns)
+    tags_columns = ["device"]
+    ignorelist = ["timestamp"]
+    for name, function in [("legacy loop", legacy_loop), ("row plan", row_plan)]:
+        durations = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            function(header, csv_rows, tags_columns, ignorelist)
+            durations.append(time.perf_counter() - started)
+        best = min(durations)
+        click.echo(
+            "{name:<12} {best:8.3f}s {rate:12.0f} rows/s".format(
+                name=name, best=best, rate=rows / best
+            )
+        )
+
+
+if __name__ == "__main__":
+    cli()
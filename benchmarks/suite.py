@@ -0,0 +1,359 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmark suite which imports a synthetic .csv file
+into a local fake InfluxDB and measures every stage of the pipeline"""
+
+import contextlib
+import gzip
+import io
+import json
+import locale
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import click
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from csvimporter import BatchWriter, CsvImporter  # noqa: E402
+
+# Day and month of the generated days are ambiguous, so the format is given
+DATETIME_FORMAT = "%d.%m.%Y %H:%M:%S"
+TIMESTAMP_FORMATS = {
+    "epoch": lambda moment: str(int(moment.timestamp())),
+    "iso": lambda moment: moment.strftime("%Y-%m-%dT%H:%M:%S"),
+    "datetime": lambda moment: moment.strftime(DATETIME_FORMAT),
+}
+
+
+def generate_csv(
+    path,
+    rows_count,
+    columns_count,
+    tag_cardinality,
+    timestamp_format="epoch",
+    decimal_point=".",
+    delimiter=",",
+):
+    """Writes a .csv file with a tag, a timestamp and numeric columns"""
+    format_timestamp = TIMESTAMP_FORMATS[timestamp_format]
+    started = datetime(2020, 1, 1)
+    with open(path, "w") as csv_file:
+        header = ["device", "timestamp"] + [
+            "value{index}".format(index=index) for index in range(columns_count)
+        ]
+        csv_file.write(delimiter.join(header) + "\n")
+        for row in range(rows_count):
+            values = [
+                "device{index}".format(index=row % tag_cardinality),
+                format_timestamp(started + timedelta(seconds=row)),
+            ]
+            values.extend(
+                "{value:.2f}".format(value=row * 0.25 + column).replace(
+                    ".", decimal_point
+                )
+                for column in range(columns_count)
+            )
+            csv_file.write(delimiter.join(values) + "\n")
+
+
+class FakeInfluxDB(object):
+    """Class to run a local HTTP server which accepts /write requests
+    of InfluxDB and counts the received points"""
+
+    def __init__(self):
+        """Constructor"""
+        self.lock = threading.Lock()
+        self.reset()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                fake.receive(body, self.headers.get("Content-Encoding"))
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def reset(self):
+        """Resets the counters"""
+        with self.lock:
+            self.points_count = 0
+            self.requests_count = 0
+            self.bytes_count = 0
+
+    def receive(self, body, encoding):
+        """Counts the points of a request body"""
+        size = len(body)
+        if encoding == "gzip":
+            body = gzip.decompress(body)
+        with self.lock:
+            self.requests_count += 1
+            self.bytes_count += size
+            self.points_count += body.count(b"\n") + (not body.endswith(b"\n"))
+
+    def __enter__(self):
+        """Starts the server"""
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        """Stops the server"""
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def peak_rss():
+    """Returns the peak resident set size of the process in KiB"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def measure(stages, name, rows_count, function):
+    """Runs a stage, records its duration and returns its result"""
+    started = time.perf_counter()
+    result = function()
+    duration = time.perf_counter() - started
+    stages[name] = {
+        "seconds": round(duration, 6),
+        "rows_per_second": round(rows_count / duration, 1) if duration else None,
+    }
+    return result
+
+
+def create_importer(path, delimiter, port, options):
+    """Returns an importer configured like the commandline would"""
+    csv_importer = CsvImporter(path, delimiter)
+    csv_importer.set_port(port)
+    csv_importer.set_server("127.0.0.1")
+    csv_importer.set_database("benchmark")
+    csv_importer.set_measurement("benchmark")
+    csv_importer.set_tags_columns("device")
+    csv_importer.set_timestamp_column("timestamp")
+    csv_importer.set_timestamp_format(
+        "epoch" if options["timestamp_format"] == "epoch" else "datetime"
+    )
+    csv_importer.set_timestamp_timezone("UTC")
+    if options["timestamp_format"] == "datetime":
+        csv_importer.set_timestamp_strptime(DATETIME_FORMAT)
+    csv_importer.set_batch_size(options["batch_size"])
+    csv_importer.set_write_concurrency(options["write_concurrency"])
+    csv_importer.set_workers(options["workers"])
+    csv_importer.set_gzip(options["gzip"])
+    csv_importer.set_engine(options["engine"])
+    csv_importer.set_convert_int_to_float(options["convert_int_to_float"])
+    if options["locale"]:
+        csv_importer.set_locale(options["locale"])
+    return csv_importer
+
+
+def import_file(connection, path, delimiter, port, rows_count, options):
+    """Sends the duration and the peak resident set size of a complete
+    import which runs in a fresh process, so earlier stages do not count"""
+    end_to_end = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        measure(
+            end_to_end,
+            "import",
+            rows_count,
+            create_importer(path, delimiter, port, options).write_data,
+        )
+    connection.send(dict(end_to_end["import"], peak_rss_kib=peak_rss()))
+    connection.close()
+
+
+def run(path, delimiter, rows_count, options):
+    """Returns the results of all stages and of the complete import"""
+    stages = {}
+    with FakeInfluxDB() as fake:
+        csv_importer = create_importer(path, delimiter, fake.port, options)
+        records = measure(
+            stages, "read", rows_count, lambda: list(csv_importer.read_records())
+        )
+        plan = csv_importer.compile_plan()
+        points = measure(
+            stages, "transform", rows_count, lambda: list(plan.transform(records))
+        )
+
+        batches = []
+
+        def encode():
+            batch_writer = BatchWriter(
+                lambda payload, count: batches.append((payload, count)),
+                options["batch_size"],
+            )
+            for point in points:
+                batch_writer.add(*point)
+            batch_writer.close()
+
+        measure(stages, "encode", rows_count, encode)
+
+        def write():
+            csv_importer.connect()
+            for payload, count in batches:
+                csv_importer.write_points(payload, count)
+
+        measure(stages, "write", rows_count, write)
+
+        fake.reset()
+        # A plain process may start parsing workers unlike a pool worker
+        context = multiprocessing.get_context("spawn")
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(
+            target=import_file,
+            args=(sender, path, delimiter, fake.port, rows_count, options),
+        )
+        process.start()
+        sender.close()
+        try:
+            end_to_end = receiver.recv()
+        except EOFError:
+            process.join()
+            raise click.ClickException(
+                "Import failed with exit code {code}".format(code=process.exitcode)
+            )
+        process.join()
+        end_to_end["points_received"] = fake.points_count
+        end_to_end["requests"] = fake.requests_count
+        end_to_end["bytes_sent"] = fake.bytes_count
+    return stages, end_to_end
+
+
+def iter_stages(results):
+    """Yields the name and result of every stage and of the complete import"""
+    yield from results["stages"].items()
+    yield "total", results["import"]
+
+
+def compare(results, baseline_path):
+    """Prints the speedup of every stage against a previous run"""
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)
+    click.echo("\nSpeedup against {path}".format(path=baseline_path))
+    baseline_stages = dict(baseline["stages"], total=baseline["import"])
+    for name, stage in iter_stages(results):
+        previous = baseline_stages.get(name)
+        if previous and stage["seconds"]:
+            click.echo(
+                "{name:<10} {speedup:6.2f}x".format(
+                    name=name, speedup=previous["seconds"] / stage["seconds"]
+                )
+            )
+
+
+@click.command()
+@click.option("--rows", default=100000, help="Number of rows (Default: 100000)")
+@click.option("--columns", default=20, help="Number of value columns (Default: 20)")
+@click.option(
+    "--tag-cardinality",
+    default=100,
+    help="Number of distinct tag values (Default: 100)",
+)
+@click.option(
+    "--timestamp-format",
+    default="epoch",
+    type=click.Choice(sorted(TIMESTAMP_FORMATS)),
+    help="Notation of the timestamp column (Default: epoch)",
+)
+@click.option(
+    "--locale",
+    help="Locale of the numeric values e.g. de_DE.UTF-8; \
+        values with decimal comma are separated by semicolons",
+)
+@click.option("--batch-size", default=5000, help="Batch size (Default: 5000)")
+@click.option("--write-concurrency", default=1, help="Write concurrency (Default: 1)")
+@click.option("--workers", default=1, help="Parsing processes (Default: 1)")
+@click.option(
+    "--engine",
+    default="row",
+    type=click.Choice(["row", "columnar"]),
+    help="Engine which transforms the rows (Default: row)",
+)
+@click.option(
+    "--convert-int-to-float",
+    is_flag=True,
+    default=False,
+    help="Convert the numeric columns to float",
+)
+@click.option("--gzip", is_flag=True, default=False, help="Gzip write requests")
+@click.option(
+    "--output",
+    type=click.Path(dir_okay=False, writable=True),
+    help="File to save the results as JSON",
+)
+@click.option(
+    "--baseline",
+    type=click.Path(exists=True, dir_okay=False),
+    help="JSON results of a previous run to compare with",
+)
+def cli(**options):
+    """Benchmark suite for the complete import pipeline"""
+    decimal_point = "."
+    delimiter = ","
+    if options["locale"]:
+        locale.setlocale(locale.LC_NUMERIC, options["locale"])
+        decimal_point = locale.localeconv()["decimal_point"]
+        if decimal_point == ",":
+            delimiter = ";"
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "benchmark.csv")
+        generate_csv(
+            path,
+            options["rows"],
+            options["columns"],
+            options["tag_cardinality"],
+            options["timestamp_format"],
+            decimal_point,
+            delimiter,
+        )
+        stages, end_to_end = run(path, delimiter, options["rows"], options)
+
+    results = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": {
+            key: value
+            for key, value in options.items()
+            if key not in ("output", "baseline")
+        },
+        "stages": stages,
+        "import": end_to_end,
+    }
+    for name, stage in iter_stages(results):
+        click.echo(
+            "{name:<10} {seconds:8.3f}s {rate:12.0f} rows/s".format(
+                name=name,
+                seconds=stage["seconds"],
+                rate=stage["rows_per_second"] or 0,
+            )
+        )
+    click.echo(
+        "Points received {points}, peak RSS {rss} KiB".format(
+            points=end_to_end["points_received"], rss=end_to_end["peak_rss_kib"]
+        )
+    )
+    if options["output"]:
+        with open(options["output"], "w") as output_file:
+            json.dump(results, output_file, indent=4, sort_keys=True)
+    if options["baseline"]:
+        compare(results, options["baseline"])
+
+
+if __name__ == "__main__":
+    cli()
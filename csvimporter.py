@@ -4,16 +4,1895 @@
 """Commandline interface
 to control CsvImporter class"""
 
+import bz2
 import csv
+import glob
+import gzip
+import hashlib
+import io
 import json
 import locale
 import logging
+import lzma
+import math
+import multiprocessing
+import os
+import random
+import re
+import signal
+import sys
+import threading
+import time
+import zlib
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from fnmatch import fnmatch
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import islice
 
 import click
-from dateutil.parser import parse
-from influxdb import InfluxDBClient
-from pytz import timezone
+import pytz
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_SAMPLE_ROWS = 1000
+DEFAULT_CHUNK_ROWS = 4096
+WORKER_CHUNK_SIZE = 4 * 1024 * 1024
+READ_BUFFER_SIZE = 1024 * 1024
+FINGERPRINT_SIZE = 4096
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_RETRY_BACKOFF = 0.5
+DEFAULT_TARGET_LATENCY = 1.0
+DEFAULT_GZIP_LEVEL = 6
+DEFAULT_POOL_SIZE = 10
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_SERIES_CACHE_SIZE = 10000
+# Shard group duration of InfluxDB for retention policies longer than 6 months
+DEFAULT_SHARD_DURATION = 7 * 24 * 3600 * 10**9
+# Nanoseconds from 0001-01-01 where InfluxDB aligns shard groups to the epoch
+SHARD_EPOCH_OFFSET = 62135596800 * 10**9
+DURATION_UNITS = OrderedDict(
+    [
+        ("ns", 1),
+        ("u", 10**3),
+        ("ms", 10**6),
+        ("s", 10**9),
+        ("m", 60 * 10**9),
+        ("h", 3600 * 10**9),
+        ("d", 24 * 3600 * 10**9),
+        ("w", 7 * 24 * 3600 * 10**9),
+    ]
+)
+DURATION_PATTERN = re.compile(r"(\d+)(ns|u|ms|s|m|h|d|w)", re.ASCII)
+DEFAULT_METRICS_INTERVAL = 10.0
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Magic bytes and file extensions of compressed .csv files
+COMPRESSIONS = OrderedDict(
+    [
+        ("gzip", (b"\x1f\x8b", (".gz", ".gzip"))),
+        ("bz2", (b"BZh", (".bz2",))),
+        ("xz", (b"\xfd7zXZ\x00", (".xz", ".lzma"))),
+        ("zstd", (b"\x28\xb5\x2f\xfd", (".zst", ".zstd"))),
+    ]
+)
+# File patterns of plain and compressed .csv files in directories
+CSV_PATTERNS = ["*.csv"] + [
+    "*.csv" + extension
+    for _, extensions in COMPRESSIONS.values()
+    for extension in extensions
+]
+# Errors of a .csv file which is missing, corrupt or cannot be parsed
+FILE_ERRORS = (ValueError, csv.Error, OSError, EOFError, zlib.error, lzma.LZMAError)
+if zstandard is not None:
+    FILE_ERRORS += (zstandard.ZstdError,)
+# Types of schema columns whereby only fields have their own converter
+FIELD_TYPES = ("float", "integer", "boolean", "string")
+SCHEMA_TYPES = FIELD_TYPES + ("tag", "timestamp", "ignore")
+# Boolean field values accepted by InfluxDB
+BOOLEAN_VALUES = dict(
+    [(value, b"true") for value in ("t", "T", "true", "True", "TRUE")]
+    + [(value, b"false") for value in ("f", "F", "false", "False", "FALSE")]
+)
+INTEGER_PATTERN = re.compile(r"[-+]?\d+", re.ASCII)
+# Range of the signed 64 bit integer fields of InfluxDB
+INTEGER_MIN = -(2**63)
+INTEGER_MAX = 2**63 - 1
+# Lines of integers which are valid integer fields without the i suffix
+# whereby at most 18 digits always fit into the range
+INTEGERS_PATTERN = re.compile(r"-?\d{1,18}(?:\n-?\d{1,18})*", re.ASCII)
+# Lines of decimal numbers which are valid float fields of the line protocol
+NUMBERS_PATTERN = re.compile(
+    r"-?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?"
+    r"(?:\n-?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?)*",
+    re.ASCII,
+)
+# Nanoseconds per unit of the write precision
+PRECISIONS = OrderedDict([("s", 10**9), ("ms", 10**6), ("u", 10**3), ("ns", 1)])
+EPOCH_NAIVE = datetime.utcfromtimestamp(0)
+EPOCH = pytz.UTC.localize(EPOCH_NAIVE)
+ZERO = timedelta(0)
+
+
+@lru_cache(maxsize=None)
+def get_timezone(tz):
+    """Returns the timezone object of a timezone name
+    which is resolved only once"""
+    return pytz.timezone(tz)
+
+
+class LineProtocolEncoder(object):
+    """Class to encode points into InfluxDB line protocol"""
+
+    def __init__(
+        self, measurement, tags_columns=None, cache_size=DEFAULT_SERIES_CACHE_SIZE
+    ):
+        """Constructor"""
+        self.measurement = LineProtocolEncoder.escape_key(measurement or "")
+        # Tags are sorted client-side to take load off the server
+        self.tag_columns = sorted(
+            set(column for column in tags_columns or [] if column)
+        )
+        self.tag_keys = [
+            b"," + LineProtocolEncoder.escape_key(column) + b"="
+            for column in self.tag_columns
+        ]
+        # Repeated tuples of tag values reuse their escaped series key
+        self.cached_series_key = lru_cache(maxsize=cache_size)(self.encode_series_key)
+
+    @staticmethod
+    def escape_key(key):
+        """Returns the escaped measurement name, tag key or field key"""
+        return (
+            key.replace("\\", "\\\\")
+            .replace(" ", "\\ ")
+            .replace(",", "\\,")
+            .replace("=", "\\=")
+            .replace("\n", "\\n")
+            .encode("utf-8")
+        )
+
+    @staticmethod
+    def escape_tag_value(value):
+        """Returns the escaped tag value"""
+        escaped = LineProtocolEncoder.escape_key(value)
+        if escaped.endswith(b"\\"):
+            escaped += b" "
+        return escaped
+
+    @staticmethod
+    def encode_value(value):
+        """Returns the encoded field value"""
+        if isinstance(value, str):
+            return (
+                '"'
+                + value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+                + '"'
+            ).encode("utf-8")
+        if isinstance(value, bool):
+            return b"true" if value else b"false"
+        if isinstance(value, int):
+            return b"%di" % value
+        return repr(float(value)).encode("ascii")
+
+    @staticmethod
+    def to_nanoseconds(timestamp):
+        """Returns a timestamp as integer nanoseconds since epoch"""
+        if isinstance(timestamp, int):
+            return timestamp
+        delta = timestamp - EPOCH
+        return (
+            delta.days * 86400 + delta.seconds
+        ) * 1000000000 + delta.microseconds * 1000
+
+    def series_key(self, tag_values=()):
+        """Returns the escaped measurement name with all sorted tags
+        whereby tag values are given in the order of tag_columns
+        and recently used series keys are taken from the cache"""
+        return self.cached_series_key(tuple(tag_values))
+
+    def encode_series_key(self, tag_values=()):
+        """Returns the escaped measurement name with all sorted tags
+        without the cache"""
+        key = self.measurement
+        for tag_key, value in zip(self.tag_keys, tag_values):
+            if value:
+                key += tag_key + self.escape_tag_value(value)
+        return key
+
+
+class TimestampParser(object):
+    """Class to convert the values of the timestamp column
+    into integer epoch timestamps in UTC of the write precision"""
+
+    # Candidates for the detection of datetime notations;
+    # None stands for ISO-8601 parsed by datetime.fromisoformat
+    DATETIME_FORMATS = [
+        None,
+        "%Y-%m-%d %H:%M:%S",
+        "%Y-%m-%d %H:%M",
+        "%Y/%m/%d %H:%M:%S",
+        "%d.%m.%Y %H:%M:%S",
+        "%d.%m.%Y %H:%M",
+        "%d.%m.%Y",
+        "%m/%d/%Y %H:%M:%S",
+        "%m/%d/%Y %H:%M",
+        "%m/%d/%Y",
+    ]
+    # Factors to nanoseconds by the number of digits of an epoch timestamp
+    EPOCH_UNITS = [
+        (11, "s", 1000000000),
+        (14, "ms", 1000000),
+        (17, "us", 1000),
+        (20, "ns", 1),
+    ]
+
+    def __init__(self, fmt="epoch", tz="UTC", strptime_format=None, precision="ns"):
+        """Constructor"""
+        if strptime_format is not None:
+            fmt = "datetime"
+        self.fmt = fmt
+        self.timezone = get_timezone(tz or "UTC")
+        self.strptime_format = strptime_format
+        # Epoch timestamps are multiplied by the factor and divided by the divisor
+        # whereby both are powers of 1000 and at least one of them is 1
+        self.unit = PRECISIONS[precision]
+        self.second_factor = 1000000000 // self.unit
+        self.epoch_factor = self.second_factor
+        self.epoch_divisor = 1
+        self.detected = strptime_format
+        self.fallback_count = 0
+        self.offsets = {}
+        self.parse = {
+            "raw": self.parse_raw,
+            "epoch": self.parse_epoch,
+            "datetime": self.parse_datetime,
+        }.get(fmt)
+        if self.parse is None:
+            raise ValueError(
+                'Timestamp format "{fmt}" is not supported'.format(fmt=fmt)
+            )
+
+    def __call__(self, value):
+        """Returns the timestamp as integer epoch of the write precision"""
+        return self.parse(value)
+
+    def detect(self, values):
+        """Detects the notation of the timestamp column from sample values"""
+        values = [value for value in values if value]
+        if not values:
+            return
+        if self.fmt == "epoch":
+            try:
+                digits = max(len(str(abs(int(float(value))))) for value in values)
+            except ValueError:
+                return
+            for max_digits, unit, factor in TimestampParser.EPOCH_UNITS:
+                if digits < max_digits:
+                    self.epoch_factor = max(factor // self.unit, 1)
+                    self.epoch_divisor = max(self.unit // factor, 1)
+                    self.detected = unit
+                    break
+        elif self.fmt == "datetime" and self.strptime_format is None:
+            for fmt in TimestampParser.DATETIME_FORMATS:
+                if TimestampParser.matches_samples(values, fmt):
+                    self.strptime_format = fmt
+                    self.detected = fmt or "iso"
+                    break
+            else:
+                logging.warning(
+                    "Timestamp notation is not detected unambiguously; "
+                    "set --timestamp-strptime to avoid the slow generic parser"
+                )
+        logging.debug(
+            'Timestamp notation is detected as "{detected}"'.format(
+                detected=self.detected
+            )
+        )
+
+    @staticmethod
+    def matches_samples(values, fmt):
+        """Returns true if all sample values are in the given notation
+        whereby notations starting with day or month also need a value
+        which rules out the swapped order of day and month"""
+        if fmt is None or not fmt.startswith(("%d", "%m")):
+            return all(TimestampParser.matches_dateutil(value, fmt) for value in values)
+        swapped = fmt.replace("%d", "%_").replace("%m", "%d").replace("%_", "%m")
+        return all(
+            TimestampParser.matches_strptime(value, fmt) for value in values
+        ) and not all(
+            TimestampParser.matches_strptime(value, swapped) for value in values
+        )
+
+    @staticmethod
+    def matches_strptime(value, fmt):
+        """Returns true if a value is in the given strptime notation"""
+        try:
+            datetime.strptime(value, fmt)
+            return True
+        except ValueError:
+            return False
+
+    @staticmethod
+    def matches_dateutil(value, fmt):
+        """Returns true if a value in the given notation is parsed
+        to the same datetime as the generic dateutil parser does"""
+        from dateutil.parser import parse
+
+        try:
+            if fmt is None:
+                parsed = datetime.fromisoformat(value)
+            else:
+                parsed = datetime.strptime(value, fmt)
+            return parsed == parse(value)
+        except (ValueError, OverflowError):
+            return False
+
+    @staticmethod
+    def parse_raw(value):
+        """Returns a raw epoch timestamp of the write precision
+        which needs no conversion"""
+        return int(value)
+
+    def parse_epoch(self, value):
+        """Returns the epoch of the write precision of an epoch timestamp"""
+        try:
+            return int(value) * self.epoch_factor // self.epoch_divisor
+        except ValueError:
+            return int(float(value) * self.epoch_factor) // self.epoch_divisor
+
+    def parse_datetime(self, value):
+        """Returns the epoch of the write precision of a datetime notation
+        with the detected or given format or with dateutil as fallback"""
+        fmt = self.strptime_format
+        try:
+            if fmt is None:
+                parsed = datetime.fromisoformat(value)
+            else:
+                parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            from dateutil.parser import parse
+
+            self.fallback_count += 1
+            parsed = parse(value)
+        return self.to_epoch(parsed)
+
+    def to_epoch(self, parsed):
+        """Returns the epoch of the write precision of a naive datetime
+        in the configured timezone or of an aware datetime"""
+        if parsed.tzinfo is not None:
+            return LineProtocolEncoder.to_nanoseconds(parsed) // self.unit
+        if self.timezone is pytz.UTC:
+            offset = ZERO
+        else:
+            # UTC offsets change at most at quarter hours,
+            # so they are resolved once per quarter of an hour
+            quarter = parsed.replace(
+                minute=parsed.minute - parsed.minute % 15, second=0, microsecond=0
+            )
+            offset = self.offsets.get(quarter)
+            if offset is None:
+                if len(self.offsets) > 100000:
+                    self.offsets.clear()
+                offset = self.timezone.localize(parsed).utcoffset()
+                self.offsets[quarter] = offset
+        delta = parsed - offset - EPOCH_NAIVE
+        return (delta.days * 86400 + delta.seconds) * self.second_factor + (
+            delta.microseconds * 1000
+        ) // self.unit
+
+
+class DateFilter(object):
+    """Class to select timestamps inside of days or ranges of days
+    which are compiled once into integer epoch bounds"""
+
+    def __init__(self, date_filter, factor=1000000000):
+        """Constructor"""
+        bounds = []
+        for part in date_filter.split(","):
+            part = part.strip()
+            if not part:
+                continue
+            first, _, last = part.partition("..")
+            first_day = datetime.strptime(first.strip(), "%Y-%m-%d")
+            last_day = datetime.strptime((last or first).strip(), "%Y-%m-%d")
+            if last_day < first_day:
+                raise ValueError(
+                    'Date range "{part}" ends before it starts'.format(part=part)
+                )
+            bounds.append(
+                (
+                    DateFilter.to_epoch(first_day) * factor,
+                    DateFilter.to_epoch(last_day + timedelta(days=1)) * factor,
+                )
+            )
+        if not bounds:
+            raise ValueError(
+                'Date filter "{date_filter}" contains no date'.format(
+                    date_filter=date_filter
+                )
+            )
+
+        # Merge overlapping ranges so that a single bisect finds the range
+        bounds.sort()
+        self.starts = []
+        self.ends = []
+        for start, end in bounds:
+            if self.ends and start <= self.ends[-1]:
+                self.ends[-1] = max(self.ends[-1], end)
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    @staticmethod
+    def to_epoch(date_obj):
+        """Returns the epoch seconds of a naive UTC datetime"""
+        delta = date_obj - EPOCH_NAIVE
+        return delta.days * 86400 + delta.seconds
+
+    def __call__(self, timestamp):
+        """Returns true if the timestamp is inside of the bounds"""
+        index = bisect_right(self.starts, timestamp) - 1
+        return index >= 0 and timestamp < self.ends[index]
+
+
+class Stats(object):
+    """Class to accumulate the time spent in every stage of the import,
+    the latency of every batch and the number of skipped and failed rows"""
+
+    STAGES = ("read", "filter", "timestamp", "conversion", "encoding", "network")
+
+    def __init__(self):
+        """Constructor"""
+        self.seconds = OrderedDict((stage, 0.0) for stage in Stats.STAGES)
+        self.latencies = []
+        self.skipped_count = 0
+        self.failed_count = 0
+        self.lock = threading.Lock()
+
+    def timed(self, stage, function):
+        """Returns a function which adds the duration of every call to a stage"""
+        seconds = self.seconds
+        clock = time.perf_counter
+
+        def timed_function(*args):
+            started = clock()
+            try:
+                return function(*args)
+            finally:
+                seconds[stage] += clock() - started
+
+        return timed_function
+
+    def timed_iter(self, stage, iterable):
+        """Yields the items of an iterable
+        and adds the time to fetch every item to a stage"""
+        seconds = self.seconds
+        clock = time.perf_counter
+        iterator = iter(iterable)
+        while True:
+            started = clock()
+            item = next(iterator, None)
+            seconds[stage] += clock() - started
+            if item is None:
+                return
+            yield item
+
+    def record_batch(self, latency):
+        """Records the latency of a sent batch"""
+        with self.lock:
+            self.latencies.append(latency)
+            self.seconds["network"] += latency
+
+    def merge(self, seconds, skipped_count=0, failed_count=0):
+        """Adds the stage times and row counts of a file or worker process"""
+        with self.lock:
+            for stage, duration in seconds.items():
+                self.seconds[stage] += duration
+            self.skipped_count += skipped_count
+            self.failed_count += failed_count
+
+    def percentile(self, percent):
+        """Returns a percentile of the batch latencies"""
+        latencies = sorted(self.latencies)
+        if not latencies:
+            return 0.0
+        rank = int(math.ceil(percent / 100.0 * len(latencies)))
+        return latencies[min(len(latencies), max(rank, 1)) - 1]
+
+    def report(self, count, duration):
+        """Returns the statistics of an import as text"""
+        total = sum(self.seconds.values())
+        lines = [
+            "Statistics",
+            "  Measurements: {count} written,"
+            " {skipped} skipped, {failed} failed".format(
+                count=count, skipped=self.skipped_count, failed=self.failed_count
+            ),
+            "  Throughput: {rate:.0f} measurements/s in {duration:.2f}s".format(
+                rate=count / duration if duration else 0, duration=duration
+            ),
+        ]
+        for stage, seconds in self.seconds.items():
+            lines.append(
+                "  Stage {stage:<11} {seconds:9.3f}s {share:5.1f}%".format(
+                    stage=stage,
+                    seconds=seconds,
+                    share=seconds / total * 100 if total else 0,
+                )
+            )
+        lines.append(
+            "  Batch latency: p50 {p50:.3f}s, p90 {p90:.3f}s, p99 {p99:.3f}s,"
+            " max {max:.3f}s of {count} batches".format(
+                p50=self.percentile(50),
+                p90=self.percentile(90),
+                p99=self.percentile(99),
+                max=max(self.latencies, default=0.0),
+                count=len(self.latencies),
+            )
+        )
+        return "\n".join(lines)
+
+
+class Progress(object):
+    """Class to print the number of processed measurements
+    on a single terminal line at most once per interval"""
+
+    def __init__(self, label, interval=1.0, stream=None):
+        """Constructor"""
+        self.label = label
+        self.interval = interval
+        self.stream = stream or sys.stderr
+        self.started = time.monotonic()
+        self.printed = self.started
+        self.active = False
+
+    def update(self, count):
+        """Prints the progress if the interval has elapsed"""
+        now = time.monotonic()
+        if now - self.printed < self.interval:
+            return
+        self.printed = now
+        self.active = True
+        self.stream.write(
+            "\r{label}: {count} measurements ({rate:.0f} measurements/s)".format(
+                label=self.label, count=count, rate=count / (now - self.started)
+            )
+        )
+        self.stream.flush()
+
+    def finish(self):
+        """Ends the progress line"""
+        if self.active:
+            self.stream.write("\n")
+            self.stream.flush()
+
+
+class RowPlan(object):
+    """Class to compile the configuration and the csv header once per file
+    into a plan which transforms every csv row in a single pass"""
+
+    # Field converters are timed one by one as the conversion stage
+    TIMED_CONVERTERS = True
+
+    def __init__(
+        self,
+        header,
+        encoder,
+        timestamp_column=None,
+        timestamp_converter=None,
+        column_ignorelist=None,
+        convert_int_to_float=False,
+        date_filter=None,
+        stats=None,
+        schema=None,
+    ):
+        """Constructor"""
+        self.header = header
+        self.encoder = encoder
+        self.width = len(header)
+        self.skipped_count = 0
+        self.failed_count = 0
+        self.date_filter = date_filter
+
+        for column in column_ignorelist or []:
+            if column not in header:
+                logging.warning(
+                    'Column "{column}" of ignorelist does not exist'.format(
+                        column=column
+                    )
+                )
+        for column in encoder.tag_columns:
+            if column not in header:
+                logging.warning(
+                    'Tag column "{column}" does not exist'.format(column=column)
+                )
+
+        self.timestamp_index = None
+        self.timestamp_converter = timestamp_converter
+        if timestamp_column is not None:
+            if timestamp_column not in header:
+                raise ValueError(
+                    'Timestamp column "{column}" does not exist'.format(
+                        column=timestamp_column
+                    )
+                )
+            self.timestamp_index = header.index(timestamp_column)
+
+        dropped_columns = set(column_ignorelist or [])
+        dropped_columns.add("")
+        self.dropped_indices = [
+            index for index, column in enumerate(header) if column in dropped_columns
+        ]
+        self.tag_indices = [
+            (
+                header.index(column)
+                if column in header and column not in dropped_columns
+                else None
+            )
+            for column in encoder.tag_columns
+        ]
+        converter = (
+            RowPlan.float_field_converter()
+            if convert_int_to_float
+            else RowPlan.string_field
+        )
+        self.series_key = encoder.cached_series_key
+
+        # Time the stages through wrapped functions only if requested
+        if stats is not None:
+            if self.TIMED_CONVERTERS:
+                converter = stats.timed("conversion", converter)
+            self.series_key = stats.timed("encoding", encoder.cached_series_key)
+            if timestamp_converter is not None:
+                self.timestamp_converter = stats.timed("timestamp", timestamp_converter)
+            if date_filter is not None:
+                self.date_filter = stats.timed("filter", date_filter)
+        # Field types of the schema pin one converter per column
+        self.field_types = {}
+        converters = {}
+        for index, column in enumerate(header):
+            field_type = (schema or {}).get(column)
+            if field_type in FIELD_TYPES:
+                self.field_types[index] = field_type
+                converters[index] = RowPlan.typed_field_converter(field_type, column)
+                if stats is not None and self.TIMED_CONVERTERS:
+                    converters[index] = stats.timed("conversion", converters[index])
+        self.field_indices = [
+            (
+                index,
+                LineProtocolEncoder.escape_key(column) + b"=",
+                converters.get(index, converter),
+            )
+            for index, column in enumerate(header)
+            if column not in dropped_columns and column not in encoder.tag_columns
+        ]
+
+    @staticmethod
+    def string_field(value):
+        """Returns the encoded field value of a string"""
+        return LineProtocolEncoder.encode_value(value)
+
+    @staticmethod
+    def typed_field_converter(field_type, column):
+        """Returns a function which encodes the values of a column
+        as field values of a fixed type and drops values of another type
+        whereby the separators of the current locale are resolved only once"""
+        conv = locale.localeconv()
+        thousands_sep = conv["thousands_sep"]
+        decimal_point = conv["decimal_point"]
+
+        def typed_field(value):
+            if not value:
+                return None
+            if field_type == "string":
+                return LineProtocolEncoder.encode_value(value)
+            encoded = None
+            if field_type == "boolean":
+                encoded = BOOLEAN_VALUES.get(value)
+            else:
+                number = value
+                if thousands_sep:
+                    number = number.replace(thousands_sep, "")
+                if field_type == "integer":
+                    if INTEGER_PATTERN.fullmatch(number):
+                        integer = int(number)
+                        if INTEGER_MIN <= integer <= INTEGER_MAX:
+                            encoded = b"%di" % integer
+                else:
+                    if decimal_point and decimal_point != ".":
+                        number = number.replace(decimal_point, ".")
+                    try:
+                        encoded = repr(float(number)).encode("ascii")
+                    except ValueError:
+                        pass
+            if encoded is None:
+                logging.warning(
+                    'Skip value "{value}" of {field_type} column "{column}"'.format(
+                        value=value, field_type=field_type, column=column
+                    )
+                )
+            return encoded
+
+        return typed_field
+
+    @staticmethod
+    def float_field_converter():
+        """Returns a function which encodes the field value of a number as float
+        or of a string if the value is not a number
+        whereby the separators of the current locale are resolved only once"""
+        conv = locale.localeconv()
+        thousands_sep = conv["thousands_sep"]
+        decimal_point = conv["decimal_point"]
+
+        def float_field(value):
+            if not value:
+                return None
+            number = value
+            if thousands_sep:
+                number = number.replace(thousands_sep, "")
+            if decimal_point and decimal_point != ".":
+                number = number.replace(decimal_point, ".")
+            try:
+                return repr(float(number)).encode("ascii")
+            except ValueError:
+                logging.warning(
+                    "could not convert string to float: {value!r}".format(value=value)
+                )
+                return LineProtocolEncoder.encode_value(value)
+
+        return float_field
+
+    def transform(self, rows):
+        """Yields a tuple of series key, field set and timestamp
+        for every row given as list of values"""
+        width = self.width
+        padding = [None] * width
+        timestamp_index = self.timestamp_index
+        timestamp_converter = self.timestamp_converter
+        date_filter = self.date_filter
+        tag_indices = self.tag_indices
+        field_indices = self.field_indices
+        series_key = self.series_key
+
+        for row in rows:
+            if not row:
+                continue
+            if len(row) < width:
+                row = row + padding[len(row) :]
+
+            timestamp = None
+            if timestamp_index is not None:
+                value = row[timestamp_index]
+                try:
+                    timestamp = timestamp_converter(value)
+                except (ValueError, OverflowError) as exception:
+                    logging.warning(
+                        'Skip row with invalid timestamp "{value}": {exception}'.format(
+                            value=value, exception=exception
+                        )
+                    )
+                    self.failed_count += 1
+                    continue
+                if date_filter is not None and not date_filter(timestamp):
+                    self.skipped_count += 1
+                    continue
+
+            field_set = []
+            for index, key, converter in field_indices:
+                value = row[index]
+                if value is None:
+                    continue
+                value = converter(value)
+                if value is not None:
+                    field_set.append(key + value)
+            if not field_set:
+                logging.debug("Skip row without any field values")
+                self.skipped_count += 1
+                continue
+
+            tag_values = tuple(
+                [row[index] if index is not None else None for index in tag_indices]
+            )
+            yield series_key(tag_values), b",".join(field_set), timestamp
+
+
+class ColumnarRowPlan(RowPlan):
+    """Class to transform chunks of csv rows column by column
+    whereby every numeric column of a chunk is converted at once
+    and columns without any number are kept as strings from then on"""
+
+    # Only whole columns are timed since they call the field converters
+    TIMED_CONVERTERS = False
+
+    def __init__(
+        self,
+        header,
+        encoder,
+        timestamp_column=None,
+        timestamp_converter=None,
+        column_ignorelist=None,
+        convert_int_to_float=False,
+        date_filter=None,
+        stats=None,
+        schema=None,
+        chunk_rows=DEFAULT_CHUNK_ROWS,
+    ):
+        """Constructor"""
+        super().__init__(
+            header,
+            encoder,
+            timestamp_column,
+            timestamp_converter,
+            column_ignorelist,
+            convert_int_to_float,
+            date_filter,
+            stats,
+            schema,
+        )
+        self.convert_int_to_float = convert_int_to_float
+        self.chunk_rows = chunk_rows
+        self.position = None
+        conv = locale.localeconv()
+        self.thousands_sep = conv["thousands_sep"]
+        self.decimal_point = conv["decimal_point"]
+        # Indices of the columns whose values are encoded as strings
+        self.string_indices = set()
+        if not convert_int_to_float:
+            self.string_indices.update(
+                index
+                for index, _, _ in self.field_indices
+                if index not in self.field_types
+            )
+        if stats is not None:
+            self.encode_column = stats.timed("conversion", self.encode_column)
+
+    def normalize(self, value):
+        """Returns a number with the separators of the current locale
+        in the notation of Python"""
+        if self.thousands_sep:
+            value = value.replace(self.thousands_sep, "")
+        if self.decimal_point and self.decimal_point != ".":
+            value = value.replace(self.decimal_point, ".")
+        return value
+
+    def encode_column(self, index, values, converter):
+        """Returns the encoded field values of a column
+        or None for every empty or missing value"""
+        encode_value = LineProtocolEncoder.encode_value
+        field_type = self.field_types.get(index)
+        if field_type in ("boolean", "string"):
+            return [converter(value) if value is not None else None for value in values]
+        if field_type is None and index in self.string_indices:
+            if self.convert_int_to_float:
+                return [encode_value(value) if value else None for value in values]
+            return [
+                encode_value(value) if value is not None else None for value in values
+            ]
+
+        positions = None
+        numbers = values
+        if None in values or "" in values:
+            positions = [position for position, value in enumerate(values) if value]
+            numbers = [values[position] for position in positions]
+            if not numbers:
+                return [None] * len(values)
+
+        def encode_cells():
+            # Typed columns keep their converter, others may turn into strings
+            if field_type is not None:
+                return [
+                    converter(value) if value is not None else None for value in values
+                ]
+            return self.encode_cells(index, values)
+
+        # Normalize and check the whole column at once; plain decimal numbers
+        # are valid float fields of the line protocol as they are
+        text = self.normalize("\n".join(numbers))
+        if field_type == "integer":
+            if not INTEGERS_PATTERN.fullmatch(text):
+                return encode_cells()
+            encoded = (text.replace("\n", "i\n") + "i").encode("ascii").split(b"\n")
+        elif NUMBERS_PATTERN.fullmatch(text):
+            encoded = text.encode("ascii").split(b"\n")
+        else:
+            try:
+                encoded = (
+                    "\n".join(map(repr, map(float, text.split("\n"))))
+                    .encode("ascii")
+                    .split(b"\n")
+                )
+            except ValueError:
+                return encode_cells()
+        # Values with line breaks would shift the following values of the column
+        if len(encoded) != len(numbers):
+            return encode_cells()
+        if positions is None:
+            return encoded
+        column = [None] * len(values)
+        for position, value in zip(positions, encoded):
+            column[position] = value
+        return column
+
+    def encode_cells(self, index, values):
+        """Returns the encoded field values of a column value by value
+        and keeps a column without any number as strings from then on"""
+        encode_value = LineProtocolEncoder.encode_value
+        column = []
+        numbers_count = 0
+        strings_count = 0
+        for value in values:
+            if not value:
+                column.append(None)
+                continue
+            try:
+                column.append(repr(float(self.normalize(value))).encode("ascii"))
+                numbers_count += 1
+            except ValueError:
+                column.append(encode_value(value))
+                strings_count += 1
+        if strings_count and not numbers_count:
+            self.string_indices.add(index)
+            logging.warning(
+                'Column "{column}" contains no numbers'
+                " and is imported as string".format(column=self.header[index])
+            )
+        elif strings_count:
+            logging.warning(
+                'Column "{column}" contains {count} values which are no numbers'.format(
+                    column=self.header[index], count=strings_count
+                )
+            )
+        return column
+
+    def transform(self, rows, read_position=None):
+        """Yields a tuple of series key, field set and timestamp
+        for every row given as list of values chunk by chunk
+        whereby the read position is advanced behind every finished chunk"""
+        rows = iter(rows)
+        if read_position is not None:
+            self.position = read_position()
+        while True:
+            chunk = list(islice(rows, self.chunk_rows))
+            if not chunk:
+                return
+            yield from self.transform_chunk(chunk)
+            if read_position is not None:
+                self.position = read_position()
+
+    def transform_chunk(self, rows):
+        """Yields the points of a chunk of rows"""
+        width = self.width
+        padding = [None] * width
+        timestamp_index = self.timestamp_index
+        timestamp_converter = self.timestamp_converter
+        date_filter = self.date_filter
+
+        kept_rows = []
+        timestamps = []
+        for row in rows:
+            if not row:
+                continue
+            if len(row) < width:
+                row = row + padding[len(row) :]
+
+            timestamp = None
+            if timestamp_index is not None:
+                value = row[timestamp_index]
+                try:
+                    timestamp = timestamp_converter(value)
+                except (ValueError, OverflowError) as exception:
+                    logging.warning(
+                        'Skip row with invalid timestamp "{value}": {exception}'.format(
+                            value=value, exception=exception
+                        )
+                    )
+                    self.failed_count += 1
+                    continue
+                if date_filter is not None and not date_filter(timestamp):
+                    self.skipped_count += 1
+                    continue
+            kept_rows.append(row)
+            timestamps.append(timestamp)
+        if not kept_rows:
+            return
+
+        columns = list(zip(*kept_rows))
+        field_columns = []
+        complete = True
+        for index, key, converter in self.field_indices:
+            encoded = self.encode_column(index, columns[index], converter)
+            if None in encoded:
+                complete = False
+                field_columns.append(
+                    [key + value if value is not None else None for value in encoded]
+                )
+            else:
+                field_columns.append(list(map(key.__add__, encoded)))
+
+        if not field_columns:
+            field_sets = [b""] * len(kept_rows)
+        elif complete:
+            field_sets = map(b",".join, zip(*field_columns))
+        else:
+            field_sets = (
+                b",".join([value for value in values if value is not None])
+                for values in zip(*field_columns)
+            )
+
+        series_key = self.series_key
+        tag_indices = self.tag_indices
+        for row, field_set, timestamp in zip(kept_rows, field_sets, timestamps):
+            if not field_set:
+                logging.debug("Skip row without any field values")
+                self.skipped_count += 1
+                continue
+            tag_values = tuple(
+                [row[index] if index is not None else None for index in tag_indices]
+            )
+            yield series_key(tag_values), field_set, timestamp
+
+
+class Checkpoint(object):
+    """Class to record the read position of every file
+    behind the last batch which is acknowledged by InfluxDB"""
+
+    def __init__(self, path, interval=5.0):
+        """Constructor"""
+        self.path = path
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.pending = OrderedDict()
+        self.positions = {}
+        self.saved = time.monotonic()
+        if os.path.exists(path) and os.path.getsize(path):
+            with open(path, "r") as checkpoint_file:
+                self.positions = json.load(checkpoint_file)
+        logging.debug(
+            'Checkpoint file is set to "{path}" with {count} files'.format(
+                path=path, count=len(self.positions)
+            )
+        )
+
+    @staticmethod
+    def key(csv_filename):
+        """Returns the key of a file in the checkpoint"""
+        return os.path.abspath(csv_filename)
+
+    def position(self, csv_filename):
+        """Returns the recorded read position of a file or None"""
+        with self.lock:
+            return self.positions.get(Checkpoint.key(csv_filename))
+
+    def begin(self, sequence, marks):
+        """Registers the read positions of a batch before it is sent"""
+        with self.lock:
+            self.pending[sequence] = [marks, False]
+
+    def acknowledge(self, sequence):
+        """Marks a batch as written and records the read positions
+        of all batches which are written in order of their sequence"""
+        with self.lock:
+            self.pending[sequence][1] = True
+            while self.pending:
+                first = next(iter(self.pending))
+                marks, done = self.pending[first]
+                if not done:
+                    break
+                del self.pending[first]
+                self.positions.update(marks)
+            if time.monotonic() - self.saved >= self.interval:
+                self.save_positions()
+
+    def forget(self, csv_filename):
+        """Removes the read position of a file which is moved aside"""
+        with self.lock:
+            if self.positions.pop(Checkpoint.key(csv_filename), None) is not None:
+                self.save_positions()
+
+    def save(self):
+        """Writes the recorded read positions into the checkpoint file"""
+        with self.lock:
+            self.save_positions()
+
+    def save_positions(self):
+        """Writes the checkpoint file atomically"""
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as checkpoint_file:
+            json.dump(self.positions, checkpoint_file, indent=4, sort_keys=True)
+        os.replace(temp_path, self.path)
+        self.saved = time.monotonic()
+
+
+class AdaptiveBatchSize(object):
+    """Class to adapt the batch size to the write latency of InfluxDB;
+    it shrinks on timeouts or too large requests
+    and grows while the latency stays below the target"""
+
+    def __init__(self, batch_size, target_latency=1.0):
+        """Constructor"""
+        self.size = batch_size
+        self.min_size = max(1, batch_size // 100)
+        self.max_size = batch_size * 4
+        self.target_latency = target_latency
+        self.lock = threading.Lock()
+
+    def shrink(self):
+        """Halves the batch size"""
+        with self.lock:
+            self.size = max(self.min_size, self.size // 2)
+        logging.debug(
+            'Batch size is shrunk to "{batch_size}"'.format(batch_size=self.size)
+        )
+
+    def observe(self, count, latency):
+        """Grows the batch size after a full batch
+        which was written faster than the target latency"""
+        with self.lock:
+            if count >= self.size and latency < self.target_latency:
+                self.size = min(self.max_size, max(self.size + 1, self.size * 5 // 4))
+
+
+class Metrics(object):
+    """Class to count the progress of an import
+    and to export it in the Prometheus text format
+    into a file or through a local HTTP /metrics endpoint"""
+
+    COUNTERS = OrderedDict(
+        [
+            ("rows_read", "Rows read from .csv files"),
+            ("points_written", "Measurements written"),
+            ("bytes_sent", "Bytes of line protocol sent"),
+            ("batches_written", "Batches written"),
+            ("write_retries", "Retries of failed writes"),
+            ("write_errors", "Batches which failed to be written"),
+        ]
+    )
+    GAUGES = OrderedDict(
+        [
+            ("queue_depth", "Batches waiting for or in the middle of a write"),
+            ("last_write_timestamp_seconds", "Unix time of the last written batch"),
+        ]
+    )
+    LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self):
+        """Constructor"""
+        self.values = dict.fromkeys(list(Metrics.COUNTERS) + list(Metrics.GAUGES), 0)
+        # The last bucket counts the latencies above all bounds
+        self.latency_buckets = [0] * (len(Metrics.LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.path = None
+        self.thread = None
+        self.server = None
+
+    def inc(self, name, value=1):
+        """Increments a counter or gauge"""
+        with self.lock:
+            self.values[name] += value
+
+    def counted_iter(self, iterable):
+        """Yields the rows of an iterable and counts them as read"""
+        # Files imported in parallel count into the same value
+        values = self.values
+        lock = self.lock
+        for row in iterable:
+            with lock:
+                values["rows_read"] += 1
+            yield row
+
+    def observe_write(self, count, size, latency):
+        """Records a written batch and its latency"""
+        with self.lock:
+            self.values["points_written"] += count
+            self.values["bytes_sent"] += size
+            self.values["batches_written"] += 1
+            self.values["last_write_timestamp_seconds"] = round(time.time(), 3)
+            self.latency_buckets[bisect_left(Metrics.LATENCY_BUCKETS, latency)] += 1
+            self.latency_sum += latency
+
+    def render(self):
+        """Returns all metrics in the Prometheus text format"""
+        lines = []
+
+        def describe(metric, description, kind):
+            lines.append(
+                "# HELP {metric} {text}".format(metric=metric, text=description)
+            )
+            lines.append("# TYPE {metric} {kind}".format(metric=metric, kind=kind))
+
+        with self.lock:
+            for name, description in Metrics.COUNTERS.items():
+                metric = "csvimporter_{name}_total".format(name=name)
+                describe(metric, description, "counter")
+                lines.append(
+                    "{metric} {value}".format(metric=metric, value=self.values[name])
+                )
+            for name, description in Metrics.GAUGES.items():
+                metric = "csvimporter_{name}".format(name=name)
+                describe(metric, description, "gauge")
+                lines.append(
+                    "{metric} {value}".format(metric=metric, value=self.values[name])
+                )
+            metric = "csvimporter_write_latency_seconds"
+            describe(metric, "Latency of written batches", "histogram")
+            cumulative = 0
+            for bound, count in zip(
+                Metrics.LATENCY_BUCKETS + ("+Inf",), self.latency_buckets
+            ):
+                cumulative += count
+                lines.append(
+                    '{metric}_bucket{{le="{bound}"}} {count}'.format(
+                        metric=metric, bound=bound, count=cumulative
+                    )
+                )
+            lines.append(
+                "{metric}_sum {value}".format(metric=metric, value=self.latency_sum)
+            )
+            lines.append(
+                "{metric}_count {value}".format(metric=metric, value=cumulative)
+            )
+        return "\n".join(lines) + "\n"
+
+    def save(self):
+        """Writes the metrics file atomically"""
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as metrics_file:
+            metrics_file.write(self.render())
+        os.replace(temp_path, self.path)
+
+    def save_periodically(self, interval):
+        """Writes the metrics file once per interval until the import stops"""
+        while not self.stopped.wait(interval):
+            try:
+                self.save()
+            except OSError as exception:
+                logging.warning(
+                    "Could not write metrics file: {exception}".format(
+                        exception=exception
+                    )
+                )
+
+    def start(self, path=None, interval=10.0, port=None, address="127.0.0.1"):
+        """Starts to export the metrics into a file
+        or through HTTP on the loopback interface by default"""
+        if path is not None:
+            self.path = path
+            self.save()
+            self.thread = threading.Thread(
+                target=self.save_periodically, args=(interval,), daemon=True
+            )
+            self.thread.start()
+        if port is not None:
+            metrics = self
+
+            class MetricsHandler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path != "/metrics":
+                        self.send_error(404)
+                        return
+                    body = metrics.render().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, *args):
+                    pass
+
+            self.server = ThreadingHTTPServer((address, port), MetricsHandler)
+            self.server.daemon_threads = True
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+            logging.debug(
+                "Serve metrics on {address} port {port}".format(
+                    address=address, port=self.server.server_port
+                )
+            )
+
+    def stop(self):
+        """Writes the final metrics file and stops the HTTP endpoint"""
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+            self.save()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+class BatchWriter(object):
+    """Class to collect points in line protocol
+    and send every batch with a single request"""
+
+    def __init__(
+        self,
+        send,
+        batch_size=5000,
+        max_age=None,
+        concurrency=1,
+        checkpoint=None,
+        batch_sizer=None,
+        stats=None,
+        metrics=None,
+    ):
+        """Constructor"""
+        self.send = send
+        self.batch_size = batch_size
+        self.max_age = max_age
+        self.buffer = bytearray()
+        self.count = 0
+        self.batch_started = None
+        self.batches_count = 0
+        self.points_count = 0
+        self.send_duration = 0.0
+        self.checkpoint = checkpoint
+        self.batch_sizer = batch_sizer
+        self.stats = stats
+        self.metrics = metrics
+        self.sequence = 0
+        self.sources = {}
+        self.final_marks = {}
+        # Points of multiple files can be added from multiple threads
+        self.buffer_lock = threading.RLock()
+        self.lock = threading.Lock()
+        self.error = None
+        self.write_failed = False
+        self.executor = None
+        if concurrency > 1:
+            self.executor = ThreadPoolExecutor(
+                max_workers=concurrency, thread_name_prefix="writer"
+            )
+            # Bound the batches in flight so that memory use stays capped
+            self.in_flight_limit = concurrency * 2
+            self.in_flight = threading.BoundedSemaphore(self.in_flight_limit)
+
+    def add(self, series_key, field_set, timestamp=None):
+        """Writes a point into the current batch
+        and flushes the batch if it is full or too old"""
+        with self.buffer_lock:
+            if not self.count:
+                self.batch_started = time.monotonic()
+            buffer = self.buffer
+            buffer += series_key
+            buffer += b" "
+            buffer += field_set
+            if timestamp is not None:
+                buffer += b" %d" % timestamp
+            buffer += b"\n"
+            self.count += 1
+            if self.count >= self.batch_size or self.expired():
+                self.flush()
+
+    def flush_if_expired(self):
+        """Sends the current batch if it is older than max age
+        even though no further point is added"""
+        with self.buffer_lock:
+            if self.expired():
+                self.flush()
+
+    def expired(self):
+        """Returns true if the current batch is older than max age"""
+        if self.max_age is None or not self.count:
+            return False
+        return time.monotonic() - self.batch_started >= self.max_age
+
+    def flush(self):
+        """Sends the current batch
+        or hands it over to the writer threads"""
+        self.raise_error()
+        with self.buffer_lock:
+            self.sequence += 1
+            sequence = self.sequence
+            if self.checkpoint is not None:
+                marks = self.final_marks
+                self.final_marks = {}
+                for key, source in self.sources.items():
+                    marks[key] = source()
+                self.checkpoint.begin(sequence, marks)
+            if not self.count:
+                if self.checkpoint is not None:
+                    self.checkpoint.acknowledge(sequence)
+                return
+            payload = bytes(self.buffer)
+            count = self.count
+            del self.buffer[:]
+            self.count = 0
+        if self.metrics is not None:
+            self.metrics.inc("queue_depth")
+        if self.executor is None:
+            self.send_batch(payload, count, sequence)
+            return
+        self.in_flight.acquire()
+        if self.error is not None:
+            self.in_flight.release()
+            self.raise_error()
+        future = self.executor.submit(self.send_batch, payload, count, sequence)
+        future.add_done_callback(self.batch_done)
+
+    def track(self, csv_filename, source):
+        """Registers a function which returns the read position of a file
+        behind all points added so far for the checkpoint"""
+        with self.buffer_lock:
+            self.sources[Checkpoint.key(csv_filename)] = source
+
+    def untrack(self, csv_filename, record=True):
+        """Unregisters a file whose final read position
+        is recorded with the next batch unless the file failed"""
+        with self.buffer_lock:
+            key = Checkpoint.key(csv_filename)
+            source = self.sources.pop(key, None)
+            if record and source is not None:
+                self.final_marks[key] = source()
+
+    def send_batch(self, payload, count, sequence=None):
+        """Sends a batch and records its timing"""
+        started = time.perf_counter()
+        try:
+            self.send(payload, count)
+        except BaseException:
+            self.write_failed = True
+            if self.metrics is not None:
+                self.metrics.inc("write_errors")
+            raise
+        finally:
+            if self.metrics is not None:
+                self.metrics.inc("queue_depth", -1)
+        duration = time.perf_counter() - started
+        if self.metrics is not None:
+            self.metrics.observe_write(count, len(payload), duration)
+        if self.checkpoint is not None and sequence is not None:
+            self.checkpoint.acknowledge(sequence)
+        if self.batch_sizer is not None:
+            self.batch_size = self.batch_sizer.size
+        if self.stats is not None:
+            self.stats.record_batch(duration)
+        with self.lock:
+            self.batches_count += 1
+            self.points_count += count
+            self.send_duration += duration
+            number = self.batches_count
+        logging.debug(
+            "Wrote batch {number} with {count} points in {duration:.3f}s"
+            " ({rate:.0f} points/s)".format(
+                number=number,
+                count=count,
+                duration=duration,
+                rate=count / duration if duration else 0,
+            )
+        )
+
+    def batch_done(self, future):
+        """Releases the slot of a sent batch and keeps the first error"""
+        self.in_flight.release()
+        if future.cancelled():
+            if self.metrics is not None:
+                self.metrics.inc("queue_depth", -1)
+            return
+        exception = future.exception()
+        if exception is not None:
+            with self.lock:
+                if self.error is None:
+                    self.error = exception
+
+    def raise_error(self):
+        """Raises the first error of the writer threads"""
+        if self.error is not None:
+            raise self.error
+
+    def drain(self):
+        """Sends the current batch and waits until all batches are sent
+        while the writer threads are kept for further batches"""
+        self.flush()
+        if self.executor is not None:
+            for _ in range(self.in_flight_limit):
+                self.in_flight.acquire()
+            for _ in range(self.in_flight_limit):
+                self.in_flight.release()
+        self.raise_error()
+
+    def close(self):
+        """Sends the current batch and waits until all batches are sent"""
+        try:
+            self.flush()
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown(wait=True, cancel_futures=self.error is not None)
+                self.executor = None
+            if self.checkpoint is not None:
+                self.checkpoint.save()
+            if self.metrics is not None:
+                self.metrics.stop()
+        self.raise_error()
+
+
+class ReorderBuffer(object):
+    """Class to hold a window of points and to add them to the batch writer
+    grouped by shard group and series and sorted by time
+    whereby batches are split at the boundaries of shard groups"""
+
+    def __init__(
+        self, add, flush, window=10000, shard_duration=DEFAULT_SHARD_DURATION, unit=1
+    ):
+        """Constructor"""
+        self.add_point = add
+        self.flush_batch = flush
+        self.window = window
+        self.shard_duration = shard_duration
+        # Timestamps of the unit in nanoseconds are shifted to the shard groups,
+        # e.g. weekly shard groups start on Mondays
+        self.shard_offset = SHARD_EPOCH_OFFSET // unit % shard_duration
+        self.points = []
+        self.unsorted = []
+        self.shard = None
+        self.snapshots = {}
+
+    def track(self, source, position):
+        """Returns a function which returns the read position of a source
+        behind the last window which was completely added to the batch writer
+        starting with the given position"""
+        key = len(self.snapshots)
+        self.snapshots[key] = [source, position]
+        return lambda: self.snapshots[key][1]
+
+    def add(self, series_key, field_set, timestamp=None):
+        """Holds a point and adds the window if it is full"""
+        if timestamp is None:
+            # Points without timestamp get the time of the server and stay unsorted
+            self.unsorted.append((series_key, field_set, timestamp))
+        else:
+            self.points.append((series_key, field_set, timestamp))
+        if len(self.points) + len(self.unsorted) >= self.window:
+            self.flush()
+
+    def flush(self):
+        """Adds the points of the window without timestamp in the order
+        they were held and then the others in order of shard group,
+        series and time"""
+        shard_duration = self.shard_duration
+        shard_offset = self.shard_offset
+        points = self.points
+        points.sort(
+            key=lambda point: (
+                (point[2] + shard_offset) // shard_duration,
+                point[0],
+                point[2],
+            )
+        )
+        points = self.unsorted + points
+        self.points = []
+        self.unsorted = []
+        add_point = self.add_point
+        for series_key, field_set, timestamp in points:
+            shard = None
+            if timestamp is not None:
+                shard = (timestamp + shard_offset) // shard_duration
+            if shard != self.shard:
+                if self.shard is not None:
+                    self.flush_batch()
+                self.shard = shard
+            add_point(series_key, field_set, timestamp)
+        for snapshot in self.snapshots.values():
+            snapshot[1] = snapshot[0]()
+
+
+def parse_duration(duration):
+    """Returns the nanoseconds of a duration like 1h, 1d or 7d"""
+    match = DURATION_PATTERN.fullmatch(duration.strip())
+    if match is None or not int(match.group(1)):
+        raise ValueError(
+            'Duration "{duration}" is not a number followed by one of {units}'.format(
+                duration=duration, units=", ".join(DURATION_UNITS)
+            )
+        )
+    return int(match.group(1)) * DURATION_UNITS[match.group(2)]
+
+
+def detect_compression(csv_filename):
+    """Returns the compression of a file detected from its magic bytes
+    or its extension or None for uncompressed files"""
+    with open(csv_filename, "rb") as csv_file:
+        magic = csv_file.read(6)
+    for compression, (signature, _) in COMPRESSIONS.items():
+        if magic.startswith(signature):
+            return compression
+    if magic:
+        return None
+    for compression, (_, extensions) in COMPRESSIONS.items():
+        if csv_filename.lower().endswith(extensions):
+            return compression
+    return None
+
+
+def open_csv(csv_filename, compression=None, start=0):
+    """Returns a .csv file opened in binary mode at an uncompressed offset
+    which is decompressed on the fly with a large read buffer"""
+    if compression is None:
+        csv_file = open(csv_filename, "rb", buffering=READ_BUFFER_SIZE)
+    elif compression == "zstd":
+        if zstandard is None:
+            raise ValueError(
+                'Reading "{filename}" requires the zstandard package'.format(
+                    filename=csv_filename
+                )
+            )
+        csv_file = io.BufferedReader(
+            zstandard.open(csv_filename, "rb"), READ_BUFFER_SIZE
+        )
+    else:
+        opener = {"gzip": gzip.open, "bz2": bz2.open, "xz": lzma.open}[compression]
+        csv_file = io.BufferedReader(opener(csv_filename, "rb"), READ_BUFFER_SIZE)
+    if start:
+        if csv_file.seekable():
+            csv_file.seek(start)
+        else:
+            # Streams without seek support are skipped by reading
+            while start > 0:
+                skipped = len(csv_file.read(min(start, READ_BUFFER_SIZE)))
+                if not skipped:
+                    break
+                start -= skipped
+    return csv_file
+
+
+class LineProtocolFile(object):
+    """Class to write batches of line protocol into a file
+    which is optionally gzip compressed and split into chunks of lines"""
+
+    def __init__(self, path, compresslevel=None, chunk_lines=None, header=b""):
+        """Constructor"""
+        self.path = path
+        self.compresslevel = compresslevel
+        self.chunk_lines = chunk_lines
+        self.header = header
+        self.output_file = None
+        self.lines = 0
+        self.paths = []
+        self.lock = threading.Lock()
+
+    def chunk_path(self):
+        """Returns the path of the next chunk
+        numbered in front of the file extension"""
+        if self.chunk_lines is None:
+            return self.path
+        base, extension = os.path.splitext(self.path)
+        if extension == ".gz":
+            base, inner_extension = os.path.splitext(base)
+            extension = inner_extension + extension
+        return "{base}-{chunk:04d}{extension}".format(
+            base=base, chunk=len(self.paths) + 1, extension=extension
+        )
+
+    def open_chunk(self):
+        """Opens the next chunk and writes the header"""
+        path = self.chunk_path()
+        logging.debug('Open output file "{path}"'.format(path=path))
+        if self.compresslevel is not None:
+            self.output_file = gzip.open(path, "wb", self.compresslevel)
+        else:
+            self.output_file = open(path, "wb", buffering=READ_BUFFER_SIZE)
+        self.output_file.write(self.header)
+        self.lines = 0
+        self.paths.append(path)
+
+    def close_chunk(self):
+        """Closes the current chunk"""
+        if self.output_file is not None:
+            self.output_file.close()
+            self.output_file = None
+
+    def write(self, payload, count):
+        """Writes a batch of measurements in line protocol
+        and starts a new chunk whenever the current one is full"""
+        with self.lock:
+            while count:
+                if self.output_file is None:
+                    self.open_chunk()
+                lines = count
+                end = len(payload)
+                if self.chunk_lines is not None:
+                    lines = min(count, self.chunk_lines - self.lines)
+                    if lines < count:
+                        end = 0
+                        for _ in range(lines):
+                            end = payload.index(b"\n", end) + 1
+                self.output_file.write(payload[:end])
+                payload = payload[end:]
+                count -= lines
+                self.lines += lines
+                if self.chunk_lines is not None and self.lines >= self.chunk_lines:
+                    self.close_chunk()
+
+    def close(self):
+        """Closes the output file"""
+        with self.lock:
+            self.close_chunk()
+
+
+class CsvReader(object):
+    """Class to read the rows of a .csv file opened in binary mode
+    while keeping track of the byte offset behind the last row"""
+
+    def __init__(self, csv_file, delimiter=",", encoding="utf-8", end=None, line=0):
+        """Constructor"""
+        self.csv_file = csv_file
+        self.encoding = encoding
+        self.end = end
+        self.position = csv_file.tell()
+        self.line = line
+        self.csv_reader = csv.reader(self.read_lines(), delimiter=delimiter)
+
+    def read_lines(self):
+        """Yields the decoded lines up to the end offset"""
+        encoding = self.encoding
+        end = self.end
+        for line in self.csv_file:
+            if end is not None and self.position >= end:
+                return
+            self.position += len(line)
+            self.line += 1
+            yield line.decode(encoding)
+
+    def __iter__(self):
+        """Returns the iterator over the rows as list of values"""
+        return self.csv_reader
+
+    def read_position(self):
+        """Returns the byte offset and line number behind the last row"""
+        return {"offset": self.position, "line": self.line}
+
+
+class FollowReader(CsvReader):
+    """Class to read the rows of a growing .csv file which waits for appended
+    lines and reopens the file after it was rotated or truncated"""
+
+    def __init__(
+        self,
+        csv_file,
+        path,
+        header,
+        delimiter=",",
+        encoding="utf-8",
+        line=0,
+        poll_interval=DEFAULT_POLL_INTERVAL,
+        idle=None,
+        stop=None,
+    ):
+        """Constructor"""
+        self.path = path
+        self.header = header
+        self.delimiter = delimiter
+        self.poll_interval = poll_interval
+        self.idle = idle
+        self.stop = stop or threading.Event()
+        super().__init__(csv_file, delimiter, encoding, line=line)
+
+    def read_lines(self):
+        """Yields the decoded complete lines until the reader is stopped"""
+        encoding = self.encoding
+        opened_file = None
+        pending = b""
+        try:
+            while True:
+                line = self.csv_file.readline()
+                if line:
+                    # A line without line break is still being written
+                    pending += line
+                    if not pending.endswith(b"\n"):
+                        continue
+                    line, pending = pending, b""
+                    self.position += len(line)
+                    self.line += 1
+                    yield line.decode(encoding)
+                    continue
+                reopened = self.reopen()
+                if reopened is not None:
+                    if opened_file is not None and opened_file is not reopened:
+                        opened_file.close()
+                    opened_file = reopened
+                    pending = b""
+                    continue
+                if self.idle is not None:
+                    self.idle()
+                try:
+                    if self.stop.wait(self.poll_interval):
+                        return
+                except KeyboardInterrupt:
+                    return
+        finally:
+            if opened_file is not None:
+                opened_file.close()
+
+    def reopen(self):
+        """Returns the file which is read from its beginning
+        if the file was rotated or truncated and otherwise None"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        current = os.fstat(self.csv_file.fileno())
+        if (stat.st_dev, stat.st_ino) != (current.st_dev, current.st_ino):
+            logging.info('File "{path}" was rotated'.format(path=self.path))
+            self.csv_file = open(self.path, "rb")
+        elif stat.st_size < self.csv_file.tell():
+            logging.info('File "{path}" was truncated'.format(path=self.path))
+            self.csv_file.seek(0)
+        else:
+            return None
+        self.position = 0
+        self.line = 0
+        self.skip_header()
+        return self.csv_file
+
+    def skip_header(self):
+        """Skips the first line of a reopened file if it repeats the header"""
+        first_line = b""
+        while not first_line.endswith(b"\n"):
+            line = self.csv_file.readline()
+            if not line and self.stop.wait(self.poll_interval):
+                break
+            first_line += line
+        row = next(
+            csv.reader([first_line.decode(self.encoding)], delimiter=self.delimiter), []
+        )
+        if row == self.header:
+            self.position = len(first_line)
+            self.line = 1
+        else:
+            self.csv_file.seek(0)
+
+
+# Importer, row plan and stage times of a parsing worker process
+worker_importer = None
+worker_plan = None
+worker_stats = None
+
+
+def init_worker(importer):
+    """Compiles the row plan once per parsing worker process"""
+    global worker_importer, worker_plan, worker_stats
+    worker_importer = importer
+    if importer.cfg_locale:
+        importer.set_locale(importer.cfg_locale)
+    worker_stats = Stats() if importer.cfg_stats else None
+    worker_plan = importer.compile_plan(worker_stats)
+
+
+def transform_range(start, end):
+    """Returns the points, skipped and failed rows, the number of lines
+    and the stage times of a byte range of the .csv file"""
+    skipped_count = worker_plan.skipped_count
+    failed_count = worker_plan.failed_count
+    with open_csv(worker_importer.csv_filename, start=start) as csv_file:
+        csv_reader = CsvReader(
+            csv_file, worker_importer.csv_delimiter, worker_importer.csv_encoding, end
+        )
+        rows = csv_reader
+        if worker_stats is not None:
+            rows = worker_stats.timed_iter("read", csv_reader)
+        points = list(worker_plan.transform(rows))
+    seconds = None
+    if worker_stats is not None:
+        seconds = dict(worker_stats.seconds)
+        for stage in seconds:
+            worker_stats.seconds[stage] = 0.0
+    return (
+        points,
+        worker_plan.skipped_count - skipped_count,
+        worker_plan.failed_count - failed_count,
+        csv_reader.line,
+        seconds,
+    )
 
 
 class CsvImporter(object):
@@ -24,11 +1903,22 @@ class CsvImporter(object):
         """Constructor"""
         logging.debug('CSV filename is set to "' + csv_filename + '"')
         logging.debug('CSV delimter is set to "' + delimiter + '"')
-        self.csv_rows = []
-        with open(csv_filename, "r") as csv_file:
-            csv_dict_reader = csv.DictReader(csv_file, delimiter=delimiter)
-            for row in csv_dict_reader:
-                self.csv_rows.append(row.copy())
+        self.csv_filename = csv_filename
+        self.csv_delimiter = delimiter
+        self.csv_encoding = locale.getpreferredencoding(False)
+        self.csv_compression = detect_compression(csv_filename)
+        if self.csv_compression is not None:
+            logging.debug(
+                'CSV compression is detected as "{compression}"'.format(
+                    compression=self.csv_compression
+                )
+            )
+        # Only the first block of a compressed file is decompressed for the header
+        with open_csv(csv_filename, self.csv_compression) as csv_file:
+            csv_reader = CsvReader(csv_file, delimiter, self.csv_encoding)
+            self.csv_header = next(iter(csv_reader), [])
+            self.csv_header_end = csv_reader.position
+            self.csv_header_lines = csv_reader.line
 
         # Declare variables
         self.cfg_server = None
@@ -42,11 +1932,71 @@ class CsvImporter(object):
         self.cfg_timestamp_column = None
         self.cfg_timestamp_format = None
         self.cfg_timestamp_timezone = None
+        self.cfg_timestamp_strptime = None
+        self.cfg_sample_rows = None
         self.cfg_locale = None
         self.cfg_date_filter = None
         self.cfg_column_ignorelist = None
         self.cfg_convert_int_to_float = None
+        self.cfg_batch_size = None
+        self.cfg_batch_max_age = None
+        self.cfg_follow = None
+        self.cfg_reorder_window = None
+        self.cfg_precision = "ns"
+        self.cfg_series_cache_size = DEFAULT_SERIES_CACHE_SIZE
+        # The InfluxDB API calls nanoseconds n
+        self.write_precision = "n"
+        self.cfg_shard_duration = DEFAULT_SHARD_DURATION
+        self.cfg_poll_interval = DEFAULT_POLL_INTERVAL
+        self.cfg_write_concurrency = None
+        self.cfg_workers = None
+        self.cfg_checkpoint = None
+        self.cfg_timeout = None
+        self.cfg_max_retries = DEFAULT_MAX_RETRIES
+        self.cfg_retry_backoff = DEFAULT_RETRY_BACKOFF
+        self.cfg_adaptive_batch_size = None
+        self.cfg_target_latency = DEFAULT_TARGET_LATENCY
+        self.cfg_gzip = None
+        self.cfg_gzip_level = DEFAULT_GZIP_LEVEL
+        self.cfg_keep_alive = True
+        self.cfg_pool_size = None
+        self.cfg_output = None
+        self.cfg_output_chunk_lines = None
+        self.cfg_output_dml = None
+        self.cfg_stats = None
+        self.cfg_metrics_file = None
+        self.cfg_metrics_port = None
+        self.cfg_metrics_interval = DEFAULT_METRICS_INTERVAL
+        self.cfg_engine = None
+        self.cfg_schema = None
+        self.cfg_infer_schema = None
+        self.schema = None
         self.influxdb_connection = None
+        self.write_headers = None
+        self.output_file = None
+        self.batch_sizer = None
+        self.stats = None
+        self.metrics = None
+        self.skipped_count = 0
+        self.failed_count = 0
+        self.follow_stop = threading.Event()
+
+    def __getstate__(self):
+        """Returns the state for parsing worker processes
+        without the runtime objects of writing like the InfluxDB connection,
+        the line protocol file, the stats and the metrics server"""
+        state = self.__dict__.copy()
+        for name in (
+            "influxdb_connection",
+            "write_headers",
+            "output_file",
+            "batch_sizer",
+            "stats",
+            "metrics",
+            "follow_stop",
+        ):
+            state[name] = None
+        return state
 
     def set_server(self, server):
         """Sets the InfluxDB server address"""
@@ -133,6 +2083,24 @@ class CsvImporter(object):
             )
         )
 
+    def set_timestamp_strptime(self, fmt):
+        """Sets the strptime format of the timestamp column"""
+        self.cfg_timestamp_strptime = fmt
+        logging.debug(
+            'Timestamp strptime format is set to "{strptime}"'.format(
+                strptime=self.cfg_timestamp_strptime
+            )
+        )
+
+    def set_sample_rows(self, rows):
+        """Sets the number of rows to sample for format detection"""
+        self.cfg_sample_rows = int(rows)
+        logging.debug(
+            'Sample rows are set to "{sample_rows}"'.format(
+                sample_rows=self.cfg_sample_rows
+            )
+        )
+
     def set_locale(self, lc):
         """Sets the locale for ctype, numeric and monetary values"""
         self.cfg_locale = lc
@@ -185,32 +2153,511 @@ class CsvImporter(object):
             )
         )
 
-    def print_columns(self):
-        """Returns all column names in pretty json format"""
-        columns = []
-        for row in self.csv_rows:
-            for key, value in row.items():
-                columns.append(key)
-            break
-        j = json.dumps(sorted(columns), indent=4, sort_keys=True)
-        return j
+    def set_batch_size(self, size):
+        """Sets the number of points to send with one request"""
+        self.cfg_batch_size = int(size)
+        logging.debug(
+            'Batch size is set to "{batch_size}"'.format(batch_size=self.cfg_batch_size)
+        )
+
+    def set_batch_max_age(self, seconds):
+        """Sets the maximum age of a batch in seconds before it is sent"""
+        self.cfg_batch_max_age = float(seconds)
+        logging.debug(
+            'Batch max age is set to "{max_age}"'.format(max_age=self.cfg_batch_max_age)
+        )
+
+    def set_precision(self, precision):
+        """Sets the precision of the written timestamps"""
+        if precision not in PRECISIONS:
+            raise ValueError(
+                'Precision "{precision}" is not one of {precisions}'.format(
+                    precision=precision, precisions=", ".join(PRECISIONS)
+                )
+            )
+        self.cfg_precision = precision
+        self.write_precision = "n" if precision == "ns" else precision
+        logging.debug(
+            'Precision is set to "{precision}"'.format(precision=self.cfg_precision)
+        )
+
+    def set_series_cache_size(self, size):
+        """Sets the number of series keys which are kept encoded"""
+        self.cfg_series_cache_size = int(size)
+        logging.debug(
+            'Series cache size is set to "{size}"'.format(
+                size=self.cfg_series_cache_size
+            )
+        )
+
+    def set_reorder_window(self, points):
+        """Sets the number of points which are sorted before they are written"""
+        self.cfg_reorder_window = int(points)
+        logging.debug(
+            'Reorder window is set to "{window}"'.format(window=self.cfg_reorder_window)
+        )
+
+    def set_shard_duration(self, duration):
+        """Sets the shard group duration at which sorted batches are split"""
+        self.cfg_shard_duration = parse_duration(duration)
+        logging.debug(
+            'Shard duration is set to "{duration}ns"'.format(
+                duration=self.cfg_shard_duration
+            )
+        )
+
+    def set_follow(self, toggle):
+        """Sets toggle to follow the .csv file while it grows"""
+        self.cfg_follow = toggle
+        logging.debug(
+            'Toggle for follow mode is set to "{follow}"'.format(
+                follow=str(self.cfg_follow)
+            )
+        )
+
+    def set_poll_interval(self, seconds):
+        """Sets the interval in seconds in which a followed file is checked"""
+        self.cfg_poll_interval = float(seconds)
+        logging.debug(
+            'Poll interval is set to "{interval}"'.format(
+                interval=self.cfg_poll_interval
+            )
+        )
+
+    def set_write_concurrency(self, concurrency):
+        """Sets the number of batches to send concurrently"""
+        self.cfg_write_concurrency = int(concurrency)
+        logging.debug(
+            'Write concurrency is set to "{concurrency}"'.format(
+                concurrency=self.cfg_write_concurrency
+            )
+        )
+
+    def set_workers(self, workers):
+        """Sets the number of processes to parse the .csv file"""
+        self.cfg_workers = int(workers)
+        logging.debug(
+            'Parsing workers are set to "{workers}"'.format(workers=self.cfg_workers)
+        )
+
+    def set_checkpoint(self, path):
+        """Sets the file to record the position of written rows"""
+        self.cfg_checkpoint = path
+        logging.debug(
+            'Checkpoint file is set to "{checkpoint}"'.format(
+                checkpoint=self.cfg_checkpoint
+            )
+        )
+
+    def set_timeout(self, seconds):
+        """Sets the timeout of requests to InfluxDB in seconds"""
+        self.cfg_timeout = float(seconds)
+        logging.debug(
+            'Request timeout is set to "{timeout}"'.format(timeout=self.cfg_timeout)
+        )
+
+    def set_max_retries(self, retries):
+        """Sets the number of retries of a failed write"""
+        self.cfg_max_retries = int(retries)
+        logging.debug(
+            'Max retries are set to "{retries}"'.format(retries=self.cfg_max_retries)
+        )
+
+    def set_retry_backoff(self, seconds):
+        """Sets the initial delay in seconds before a failed write is retried"""
+        self.cfg_retry_backoff = float(seconds)
+        logging.debug(
+            'Retry backoff is set to "{backoff}"'.format(backoff=self.cfg_retry_backoff)
+        )
+
+    def set_adaptive_batch_size(self, toggle):
+        """Sets toggle for adaptive batch sizing"""
+        self.cfg_adaptive_batch_size = toggle
+        logging.debug(
+            'Toggle for adaptive batch size is set to "{adaptive}"'.format(
+                adaptive=str(self.cfg_adaptive_batch_size)
+            )
+        )
+
+    def set_target_latency(self, seconds):
+        """Sets the write latency in seconds up to which batches grow"""
+        self.cfg_target_latency = float(seconds)
+        logging.debug(
+            'Target latency is set to "{latency}"'.format(
+                latency=self.cfg_target_latency
+            )
+        )
+
+    def set_gzip(self, toggle):
+        """Sets toggle for gzip compressed write requests"""
+        self.cfg_gzip = toggle
+        logging.debug(
+            'Toggle for gzip is set to "{gzip}"'.format(gzip=str(self.cfg_gzip))
+        )
+
+    def set_gzip_level(self, level):
+        """Sets the compression level of gzip compressed write requests"""
+        self.cfg_gzip_level = int(level)
+        logging.debug(
+            'Gzip level is set to "{level}"'.format(level=self.cfg_gzip_level)
+        )
+
+    def set_keep_alive(self, toggle):
+        """Sets toggle for reusing HTTP connections to InfluxDB"""
+        self.cfg_keep_alive = toggle
+        logging.debug(
+            'Toggle for keep-alive is set to "{keep_alive}"'.format(
+                keep_alive=str(self.cfg_keep_alive)
+            )
+        )
+
+    def set_pool_size(self, size):
+        """Sets the number of HTTP connections kept open to InfluxDB"""
+        self.cfg_pool_size = int(size)
+        logging.debug(
+            'Pool size is set to "{pool_size}"'.format(pool_size=self.cfg_pool_size)
+        )
+
+    def set_output(self, path):
+        """Sets the file to write line protocol into instead of InfluxDB"""
+        self.cfg_output = path
+        logging.debug('Output file is set to "{output}"'.format(output=self.cfg_output))
+
+    def set_output_chunk_lines(self, lines):
+        """Sets the number of measurements after which
+        a new output file is started"""
+        self.cfg_output_chunk_lines = int(lines)
+        logging.debug(
+            'Output chunk lines are set to "{lines}"'.format(
+                lines=self.cfg_output_chunk_lines
+            )
+        )
+
+    def set_output_dml(self, toggle):
+        """Sets toggle for the header of influx -import in output files"""
+        self.cfg_output_dml = toggle
+        logging.debug(
+            'Toggle for output DML header is set to "{dml}"'.format(
+                dml=str(self.cfg_output_dml)
+            )
+        )
+
+    def set_stats(self, toggle):
+        """Sets toggle for the statistics report of an import"""
+        self.cfg_stats = toggle
+        logging.debug(
+            'Toggle for statistics is set to "{stats}"'.format(
+                stats=str(self.cfg_stats)
+            )
+        )
+
+    def set_metrics_file(self, path):
+        """Sets the file to export metrics into in the Prometheus text format"""
+        self.cfg_metrics_file = path
+        logging.debug(
+            'Metrics file is set to "{path}"'.format(path=self.cfg_metrics_file)
+        )
+
+    def set_metrics_port(self, port):
+        """Sets the port of the local HTTP /metrics endpoint"""
+        self.cfg_metrics_port = int(port)
+        logging.debug(
+            'Metrics port is set to "{port}"'.format(port=self.cfg_metrics_port)
+        )
+
+    def set_metrics_interval(self, seconds):
+        """Sets the interval in seconds in which the metrics file is updated"""
+        self.cfg_metrics_interval = float(seconds)
+        logging.debug(
+            'Metrics interval is set to "{interval}"'.format(
+                interval=self.cfg_metrics_interval
+            )
+        )
+
+    def set_engine(self, engine):
+        """Sets the engine which transforms the rows"""
+        self.cfg_engine = engine
+        logging.debug('Engine is set to "{engine}"'.format(engine=self.cfg_engine))
+
+    def set_schema(self, path):
+        """Sets the JSON file which maps columns to their types"""
+        self.cfg_schema = path
+        logging.debug('Schema is set to "{schema}"'.format(schema=self.cfg_schema))
+
+    def set_infer_schema(self, toggle):
+        """Sets toggle for the inference of the column types"""
+        self.cfg_infer_schema = toggle
+        logging.debug(
+            'Toggle for schema inference is set to "{infer}"'.format(
+                infer=str(self.cfg_infer_schema)
+            )
+        )
+
+    def print_columns(self):
+        """Returns all column names in pretty json format"""
+        j = json.dumps(sorted(self.csv_header), indent=4, sort_keys=True)
+        return j
+
+    def print_schema(self):
+        """Returns the type of every column in pretty json format"""
+        j = json.dumps(self.infer_schema(self.sample_records()), indent=4)
+        return j
+
+    def print_rows(self):
+        """Returns all rows in pretty json format"""
+        return "".join(self.iter_print_rows())
+
+    def iter_print_rows(self):
+        """Yields all rows in pretty json format piece by piece
+        so that the output never has to be held in memory"""
+        separator = "[\n"
+        for row in self.read_rows():
+            j = json.dumps(row, indent=4, sort_keys=True)
+            yield separator + "    " + j.replace("\n", "\n    ")
+            separator = ",\n"
+        yield "[]" if separator == "[\n" else "\n]"
+
+    def read_rows(self):
+        """Yields the rows of the .csv file one by one as dictionary"""
+        with io.TextIOWrapper(
+            open_csv(self.csv_filename, self.csv_compression),
+            encoding=self.csv_encoding,
+        ) as csv_file:
+            yield from csv.DictReader(csv_file, delimiter=self.csv_delimiter)
+
+    def read_records(self, start=None, end=None):
+        """Yields the rows of the .csv file one by one as list of values
+        optionally only between two byte offsets at line boundaries"""
+        if start is None:
+            start = self.csv_header_end
+        with open_csv(self.csv_filename, self.csv_compression, start) as csv_file:
+            yield from CsvReader(csv_file, self.csv_delimiter, self.csv_encoding, end)
+
+    def split_ranges(self, chunk_size=WORKER_CHUNK_SIZE, start=None):
+        """Yields byte ranges of the .csv file behind the header
+        or behind the start offset which are aligned to line boundaries"""
+        with open(self.csv_filename, "rb") as csv_file:
+            size = os.fstat(csv_file.fileno()).st_size
+            if start is None:
+                start = self.csv_header_end
+            while start < size:
+                csv_file.seek(start + chunk_size)
+                csv_file.readline()
+                end = min(csv_file.tell(), size)
+                yield start, end
+                start = end
+
+    def transform_parallel(
+        self, chunk_size=WORKER_CHUNK_SIZE, position=None, stats=None, metrics=None
+    ):
+        """Yields the points of the .csv file in order of the file
+        while byte ranges are parsed by multiple worker processes
+        whose stage times and lines are optionally added
+        to the statistics and metrics"""
+        if position is None:
+            position = {"offset": self.csv_header_end, "line": self.csv_header_lines}
+        self.parallel_position = position
+        with multiprocessing.Pool(
+            self.cfg_workers, initializer=init_worker, initargs=(self,)
+        ) as pool:
+            pending = deque()
+            ranges = self.split_ranges(chunk_size, position["offset"])
+            while True:
+                # Keep a bounded number of ranges in flight
+                while len(pending) < self.cfg_workers * 2:
+                    byte_range = next(ranges, None)
+                    if byte_range is None:
+                        break
+                    pending.append(
+                        (byte_range, pool.apply_async(transform_range, byte_range))
+                    )
+                if not pending:
+                    break
+                byte_range, result = pending.popleft()
+                points, skipped_count, failed_count, lines, seconds = result.get()
+                self.skipped_count += skipped_count
+                self.failed_count += failed_count
+                if stats is not None and seconds is not None:
+                    stats.merge(seconds)
+                if metrics is not None:
+                    metrics.inc("rows_read", lines)
+                yield from points
+                # The position moves behind a range once all its points are added
+                self.parallel_position = {
+                    "offset": byte_range[1],
+                    "line": self.parallel_position["line"] + lines,
+                }
+
+    def sample_records(self):
+        """Returns the first rows of the .csv file as list of values"""
+        records = self.read_records()
+        try:
+            return list(islice(records, self.cfg_sample_rows or DEFAULT_SAMPLE_ROWS))
+        finally:
+            records.close()
+
+    def compile_timestamp_parser(self, samples, column=None):
+        """Returns the timestamp parser for the timestamp column
+        with the notation detected from the sample rows"""
+        timestamp_parser = TimestampParser(
+            self.cfg_timestamp_format or "epoch",
+            self.cfg_timestamp_timezone,
+            self.cfg_timestamp_strptime,
+            self.cfg_precision,
+        )
+        index = self.csv_header.index(column or self.cfg_timestamp_column)
+        timestamp_parser.detect(
+            [sample[index] for sample in samples if len(sample) > index]
+        )
+        return timestamp_parser
+
+    def infer_schema(self, samples):
+        """Returns the type of every column in order of the csv header
+        whereby configured columns keep their role, the types of the schema
+        file win and all other types are inferred from the sample rows
+        with inferred integers as floats if integers are converted"""
+        thousands_sep = locale.localeconv()["thousands_sep"]
+        decimal_point = locale.localeconv()["decimal_point"]
+        schema = OrderedDict()
+        for index, column in enumerate(self.csv_header):
+            if column in (self.cfg_tags_columns or []):
+                schema[column] = "tag"
+                continue
+            if column == self.cfg_timestamp_column:
+                schema[column] = "timestamp"
+                continue
+            if column in (self.cfg_column_ignorelist or []):
+                schema[column] = "ignore"
+                continue
+            values = [
+                sample[index]
+                for sample in samples
+                if len(sample) > index and sample[index]
+            ]
+            schema[column] = "string"
+            for field_type in ("integer", "float", "boolean"):
+                if values and all(
+                    self.matches_type(value, field_type, thousands_sep, decimal_point)
+                    for value in values
+                ):
+                    # Only inferred integers give way to the float conversion
+                    if field_type == "integer" and self.cfg_convert_int_to_float:
+                        field_type = "float"
+                    schema[column] = field_type
+                    break
+        if self.cfg_schema is not None:
+            with open(self.cfg_schema) as schema_file:
+                overrides = json.load(schema_file)
+            for column, column_type in overrides.items():
+                if column_type not in SCHEMA_TYPES:
+                    raise ValueError(
+                        'Type "{column_type}" of column "{column}" is not one of '
+                        "{types}".format(
+                            column_type=column_type,
+                            column=column,
+                            types=", ".join(SCHEMA_TYPES),
+                        )
+                    )
+                if column not in schema:
+                    logging.warning(
+                        'Column "{column}" of the schema is not in the header'.format(
+                            column=column
+                        )
+                    )
+                    continue
+                schema[column] = column_type
+        return schema
 
-    def print_rows(self):
-        """Returns all rows in pretty json format"""
-        j = json.dumps(self.csv_rows, indent=4, sort_keys=True)
-        return j
+    @staticmethod
+    def matches_type(value, field_type, thousands_sep="", decimal_point="."):
+        """Returns true if a value can be encoded as field of a type"""
+        if field_type == "boolean":
+            return value in BOOLEAN_VALUES
+        if thousands_sep:
+            value = value.replace(thousands_sep, "")
+        if field_type == "integer":
+            return INTEGER_PATTERN.fullmatch(value) is not None
+        if decimal_point and decimal_point != ".":
+            value = value.replace(decimal_point, ".")
+        try:
+            float(value)
+        except ValueError:
+            return False
+        return True
+
+    def compile_plan(self, stats=None):
+        """Returns the row plan for the current configuration and csv header
+        which optionally times its stages"""
+        samples = None
+        # Without the float conversion fields keep the type of their column
+        if self.schema is None and (
+            self.cfg_schema
+            or self.cfg_infer_schema
+            or self.cfg_convert_int_to_float is False
+        ):
+            samples = self.sample_records()
+            self.schema = self.infer_schema(samples)
+            logging.debug(
+                'Schema is inferred as "{schema}"'.format(
+                    schema=json.dumps(self.schema)
+                )
+            )
+        tags_columns = self.cfg_tags_columns
+        timestamp_column = self.cfg_timestamp_column
+        column_ignorelist = self.cfg_column_ignorelist
+        if self.schema is not None:
+            tags_columns = [
+                column for column, kind in self.schema.items() if kind == "tag"
+            ]
+            timestamp_column = next(
+                (column for column, kind in self.schema.items() if kind == "timestamp"),
+                None,
+            )
+            # The timestamp column keeps its role even if it is ignored as field
+            column_ignorelist = [
+                column
+                for column, kind in self.schema.items()
+                if kind == "ignore" or column in (self.cfg_column_ignorelist or [])
+            ]
+        timestamp_parser = None
+        if timestamp_column is not None and timestamp_column in self.csv_header:
+            if samples is None:
+                samples = self.sample_records()
+            timestamp_parser = self.compile_timestamp_parser(samples, timestamp_column)
+        date_filter = None
+        if self.cfg_date_filter is not None:
+            if timestamp_column is None:
+                logging.warning("Date filter is ignored without timestamp column")
+            else:
+                date_filter = DateFilter(
+                    self.cfg_date_filter, 1000000000 // PRECISIONS[self.cfg_precision]
+                )
+        plan_class = RowPlan
+        if self.cfg_engine == "columnar":
+            if self.cfg_follow:
+                # Chunks would wait for rows which are not yet appended
+                logging.warning("Followed files are transformed row by row")
+            else:
+                plan_class = ColumnarRowPlan
+        return plan_class(
+            self.csv_header,
+            LineProtocolEncoder(
+                self.cfg_measurement, tags_columns, self.cfg_series_cache_size
+            ),
+            timestamp_column=timestamp_column,
+            timestamp_converter=timestamp_parser,
+            column_ignorelist=column_ignorelist,
+            convert_int_to_float=self.cfg_convert_int_to_float is True,
+            date_filter=date_filter,
+            stats=stats,
+            schema=self.schema,
+        )
 
     @staticmethod
     def match_date(epoch_timestamp, date_str="2020-01-01"):
         """Returns true if timestamp is inside the range of date
         Returns false if timestamp is outside the range of date"""
-        utc_timestamp = datetime.utcfromtimestamp(int(epoch_timestamp))
-        date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-        date_nextday = date_obj + timedelta(days=1)
-        if utc_timestamp >= date_obj and utc_timestamp < date_nextday:
-            return True
-        else:
-            return False
+        return DateFilter(date_str, factor=1)(int(epoch_timestamp))
 
     @staticmethod
     def convert_int_to_float(data, tags_columns=None):
@@ -232,43 +2679,150 @@ class CsvImporter(object):
     def convert_into_utc_timestamp(date_str, fmt, tz):
         """Converts a datetime or epoch string into UTC timezone
         because InfluxDB only works internally with UTC timestamps"""
-        datetime_tz = timezone("UTC").localize(datetime.utcfromtimestamp(0))
+        datetime_tz = EPOCH
 
         if fmt == "raw":
             return int(date_str)
         elif fmt == "epoch":
             datetime_naive = datetime.utcfromtimestamp(int(date_str))
-            datetime_tz = timezone("UTC").localize(datetime_naive)
+            datetime_tz = pytz.UTC.localize(datetime_naive)
         elif fmt == "datetime":
+            from dateutil.parser import parse
+
             datetime_naive = parse(date_str)
-            datetime_tz = timezone(tz).localize(datetime_naive)
+            datetime_tz = get_timezone(tz).localize(datetime_naive)
         else:
             logging.error("Time format is not supported")
 
-        datetime_utc = datetime_tz.astimezone(timezone("UTC"))
+        datetime_utc = datetime_tz.astimezone(pytz.UTC)
         return datetime_utc
 
-    def write_measurement(self, name, fields, tags=None, time=None):
-        """Writes a single measurement to InfluxDB"""
-        json_body = [{"measurement": name, "fields": fields}]
-        if tags is not None:
-            json_body[0]["tags"] = tags
-        if time is not None:
-            json_body[0]["time"] = (
-                time.strftime("%Y-%m-%dT%H:%M:%SZ") if isinstance(time, str) else time
+    def write_points(self, payload, count):
+        """Writes a batch of measurements in line protocol to InfluxDB
+        and retries failed writes with jittered exponential backoff"""
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                logging.debug(
+                    "Send {count} measurements with {size} bytes".format(
+                        count=count, size=len(payload)
+                    )
+                )
+                if self.cfg_gzip:
+                    self.influxdb_connection.request(
+                        url="write",
+                        method="POST",
+                        params={
+                            "db": self.cfg_database,
+                            "precision": self.write_precision,
+                        },
+                        data=gzip.compress(
+                            payload, compresslevel=self.cfg_gzip_level, mtime=0
+                        ),
+                        expected_response_code=204,
+                        headers=self.write_headers,
+                    )
+                else:
+                    self.influxdb_connection.write_points(
+                        [payload.rstrip(b"\n").decode("utf-8")],
+                        time_precision=self.write_precision,
+                        protocol="line",
+                    )
+                break
+            except Exception as exception:
+                import requests
+                from influxdb.exceptions import InfluxDBClientError
+
+                too_large = (
+                    isinstance(exception, InfluxDBClientError) and exception.code == 413
+                )
+                if self.batch_sizer is not None and (
+                    too_large or isinstance(exception, requests.exceptions.Timeout)
+                ):
+                    self.batch_sizer.shrink()
+                if too_large and count > 1:
+                    for part_payload, part_count in split_payload(payload):
+                        self.write_points(part_payload, part_count)
+                    return
+                if not is_retryable(exception) or attempt >= self.cfg_max_retries:
+                    logging.error(exception)
+                    raise
+                delay = min(60.0, self.cfg_retry_backoff * 2**attempt)
+                delay *= 0.5 + random.random() / 2
+                attempt += 1
+                if self.metrics is not None:
+                    self.metrics.inc("write_retries")
+                logging.warning(
+                    "Write failed ({exception}), retry {attempt}/{retries}"
+                    " in {delay:.2f}s".format(
+                        exception=exception,
+                        attempt=attempt,
+                        retries=self.cfg_max_retries,
+                        delay=delay,
+                    )
+                )
+                time.sleep(delay)
+        if self.batch_sizer is not None:
+            self.batch_sizer.observe(count, time.perf_counter() - started)
+
+    def resume_position(self, checkpoint=None):
+        """Returns the read position to start from
+        which is behind the header or recorded in the checkpoint"""
+        position = {"offset": self.csv_header_end, "line": self.csv_header_lines}
+        if checkpoint is None:
+            return position
+        recorded = checkpoint.position(self.csv_filename)
+        if recorded is None:
+            return position
+        # Another file under the same path starts with other bytes
+        if "digest" in recorded and self.fingerprint(recorded["head"]) != {
+            "head": recorded["head"],
+            "digest": recorded["digest"],
+        }:
+            logging.warning(
+                'File "{filename}" has changed since its checkpoint'
+                " and is imported from the beginning".format(filename=self.csv_filename)
             )
-        try:
-            logging.debug(json_body)
-            self.influxdb_connection.write_points(json_body)
-            if logging.getLogger().getEffectiveLevel() == logging.WARNING:
-                print(".", end="", flush=True)
-        except Exception as exception:
-            logging.error(exception)
-            raise
+            return position
+        # Offsets count uncompressed bytes, so only plain files are comparable
+        if self.csv_compression is None and recorded["offset"] > os.path.getsize(
+            self.csv_filename
+        ):
+            logging.warning(
+                'File "{filename}" is smaller than its checkpoint'
+                " and is imported from the beginning".format(filename=self.csv_filename)
+            )
+            return position
+        logging.info(
+            'Resume "{filename}" at line {line} (byte offset {offset})'.format(
+                filename=self.csv_filename,
+                line=recorded["line"],
+                offset=recorded["offset"],
+            )
+        )
+        return {"offset": recorded["offset"], "line": recorded["line"]}
+
+    def fingerprint(self, size=FINGERPRINT_SIZE):
+        """Returns the length and digest of the first uncompressed bytes
+        which identify the file in the checkpoint"""
+        with open_csv(self.csv_filename, self.csv_compression) as csv_file:
+            head = csv_file.read(size)
+        return {"head": len(head), "digest": hashlib.sha1(head).hexdigest()}
+
+    def connect(self):
+        """Initializes the InfluxDB connection"""
+        # The InfluxDB stack is only loaded if data is written
+        from influxdb import InfluxDBClient
 
-    def write_data(self):
-        """Writes processed data to InfluxDB"""
         logging.debug("Initialize InfluxDB connection")
+        headers = {}
+        if not self.cfg_keep_alive:
+            headers["Connection"] = "close"
+        self.write_headers = dict(
+            headers,
+            **{"Content-Type": "application/octet-stream", "Content-Encoding": "gzip"},
+        )
         self.influxdb_connection = InfluxDBClient(
             self.cfg_server,
             self.cfg_port,
@@ -277,65 +2831,544 @@ class CsvImporter(object):
             self.cfg_database,
             ssl=self.cfg_ssl,
             verify_ssl=self.cfg_ssl,
+            timeout=self.cfg_timeout,
+            pool_size=self.cfg_pool_size
+            or max(DEFAULT_POOL_SIZE, self.cfg_write_concurrency or 1),
+            headers=headers,
+            # Failed writes are only retried with the backoff of write_points
+            retries=1,
         )
 
+    def open_output(self):
+        """Opens the line protocol file which replaces InfluxDB"""
+        header = b""
+        if self.cfg_output_dml:
+            header = b"# DML\n"
+            if self.cfg_database is not None:
+                header += "# CONTEXT-DATABASE: {database}\n".format(
+                    database=self.cfg_database
+                ).encode("utf-8")
+        compresslevel = None
+        if self.cfg_gzip or self.cfg_output.endswith(".gz"):
+            compresslevel = self.cfg_gzip_level
+        self.output_file = LineProtocolFile(
+            self.cfg_output, compresslevel, self.cfg_output_chunk_lines, header
+        )
+
+    def close_output(self):
+        """Closes the line protocol file"""
+        if self.output_file is not None:
+            self.output_file.close()
+
+    def create_batch_writer(self):
+        """Returns a batch writer which sends through the InfluxDB connection
+        or writes into the line protocol file"""
+        batch_size = self.cfg_batch_size or DEFAULT_BATCH_SIZE
+        self.stats = Stats() if self.cfg_stats else None
+        self.metrics = None
+        if self.cfg_metrics_file is not None or self.cfg_metrics_port is not None:
+            self.metrics = Metrics()
+            self.metrics.start(
+                self.cfg_metrics_file,
+                self.cfg_metrics_interval,
+                self.cfg_metrics_port,
+            )
+        self.batch_sizer = None
+        if self.cfg_adaptive_batch_size:
+            self.batch_sizer = AdaptiveBatchSize(batch_size, self.cfg_target_latency)
+        max_age = self.cfg_batch_max_age
+        if self.cfg_follow and max_age is None:
+            # Appended rows are written at the latest after one poll interval
+            max_age = self.cfg_poll_interval
+        return BatchWriter(
+            self.output_file.write if self.output_file else self.write_points,
+            batch_size,
+            max_age,
+            self.cfg_write_concurrency or 1,
+            Checkpoint(self.cfg_checkpoint) if self.cfg_checkpoint else None,
+            self.batch_sizer,
+            self.stats,
+            self.metrics,
+        )
+
+    def write_data(self, batch_writer=None):
+        """Writes processed data to InfluxDB
+        optionally through a batch writer shared by multiple files
+        and returns the number of measurements"""
+        shared = batch_writer is not None
+        if not shared:
+            if self.cfg_output is not None:
+                self.open_output()
+            else:
+                self.connect()
+            batch_writer = self.create_batch_writer()
+
+        started = time.perf_counter()
+        self.skipped_count = 0
+        self.failed_count = 0
         measurements_count = 0
-        for row in self.csv_rows:
-            utc_timestamp = None
-            if self.cfg_timestamp_column is not None:
-                utc_timestamp = CsvImporter.convert_into_utc_timestamp(
-                    row[self.cfg_timestamp_column],
-                    self.cfg_timestamp_format,
-                    self.cfg_timestamp_timezone,
-                )
-
-            row_copy = row.copy()
-            if (
-                self.cfg_date_filter is not None
-                and self.cfg_timestamp_column is not None
-            ):
-                match = CsvImporter.match_date(
-                    row[self.cfg_timestamp_column], self.cfg_date_filter
+        position = self.resume_position(batch_writer.checkpoint)
+
+        follow = self.cfg_follow
+        if follow and self.csv_compression is not None:
+            logging.warning(
+                "Compressed file {filename} is not followed".format(
+                    filename=self.csv_filename
+                )
+            )
+            follow = False
+        parallel = self.cfg_workers is not None and self.cfg_workers > 1
+        if parallel and follow:
+            logging.warning(
+                "Followed file {filename} is parsed by a single process".format(
+                    filename=self.csv_filename
+                )
+            )
+            parallel = False
+        if parallel and self.csv_compression is not None:
+            logging.warning(
+                "Compressed file {filename} is parsed by a single process".format(
+                    filename=self.csv_filename
                 )
-                if not match:
-                    row_copy = None
+            )
+            parallel = False
 
-            if self.cfg_column_ignorelist is not None:
-                for column in self.cfg_column_ignorelist:
-                    if row_copy is not None:
-                        del row_copy[column]
+        # Stage times of this file are added to the statistics of the writer
+        stats = Stats() if batch_writer.stats is not None else None
+        add = batch_writer.add
+        if stats is not None:
+            add = stats.timed("encoding", batch_writer.add)
+        reorder = None
+        if self.cfg_reorder_window:
+            reorder = ReorderBuffer(
+                add,
+                batch_writer.flush,
+                self.cfg_reorder_window,
+                max(self.cfg_shard_duration // PRECISIONS[self.cfg_precision], 1),
+                PRECISIONS[self.cfg_precision],
+            )
+            add = reorder.add
 
-            if self.cfg_convert_int_to_float is True:
-                if row_copy is not None:
-                    row_copy = CsvImporter.convert_int_to_float(
-                        row_copy, self.cfg_tags_columns
-                    )
+        def track(source):
+            # Held points are not yet behind the read position
+            if reorder is not None:
+                source = reorder.track(source, position)
+            if batch_writer.checkpoint is not None:
+                # The first bytes tell another file under the same path apart
+                fingerprint = self.fingerprint()
+                read_position = source
 
-            tags = None
-            if self.cfg_tags_columns is not None:
-                tags = {}
-                for column in self.cfg_tags_columns:
-                    if row_copy and column in row_copy:
-                        if column == "" or row_copy[column] == "":
-                            del row_copy[column]
-                            continue
-                        else:
-                            tags[column] = row_copy[column]
-                            del row_copy[column]
+                def source():
+                    return dict(read_position(), **fingerprint)
 
-            if row_copy is not None:
-                self.write_measurement(
-                    self.cfg_measurement, row_copy, tags=tags, time=utc_timestamp
+            batch_writer.track(self.csv_filename, source)
+
+        def idle():
+            if reorder is not None:
+                reorder.flush()
+            batch_writer.flush_if_expired()
+
+        progress = None
+        if (
+            logging.getLogger().getEffectiveLevel() == logging.WARNING
+            and sys.stderr.isatty()
+        ):
+            progress = Progress(self.csv_filename)
+
+        with open_csv(
+            self.csv_filename, self.csv_compression, position["offset"]
+        ) as csv_file:
+            plan = None
+            if parallel:
+                points = self.transform_parallel(
+                    position=position, stats=stats, metrics=batch_writer.metrics
+                )
+                track(lambda: self.parallel_position)
+            else:
+                plan = self.compile_plan(stats)
+                if follow:
+                    csv_reader = FollowReader(
+                        csv_file,
+                        self.csv_filename,
+                        self.csv_header,
+                        self.csv_delimiter,
+                        self.csv_encoding,
+                        line=position["line"],
+                        poll_interval=self.cfg_poll_interval,
+                        idle=idle,
+                        stop=self.follow_stop,
+                    )
+                else:
+                    csv_reader = CsvReader(
+                        csv_file,
+                        self.csv_delimiter,
+                        self.csv_encoding,
+                        line=position["line"],
+                    )
+                rows = csv_reader
+                if stats is not None:
+                    rows = stats.timed_iter("read", csv_reader)
+                if batch_writer.metrics is not None:
+                    rows = batch_writer.metrics.counted_iter(rows)
+                if isinstance(plan, ColumnarRowPlan):
+                    # Chunks are read ahead of their points
+                    points = plan.transform(rows, csv_reader.read_position)
+                    track(lambda: plan.position)
+                else:
+                    points = plan.transform(rows)
+                    track(csv_reader.read_position)
+            try:
+                for series_key, field_set, timestamp in points:
+                    add(series_key, field_set, timestamp)
+                    measurements_count += 1
+                    if progress is not None and not measurements_count & 0x3FF:
+                        progress.update(measurements_count)
+                if reorder is not None:
+                    reorder.flush()
+                batch_writer.untrack(self.csv_filename)
+            except BaseException:
+                batch_writer.untrack(self.csv_filename, record=False)
+                raise
+            finally:
+                if not shared:
+                    try:
+                        batch_writer.close()
+                    finally:
+                        self.close_output()
+        if plan is not None:
+            self.skipped_count = plan.skipped_count
+            self.failed_count = plan.failed_count
+            cache_info = plan.encoder.cached_series_key.cache_info()
+            lookups = cache_info.hits + cache_info.misses
+            logging.debug(
+                "Series key cache of {filename}: {hits} hits of {lookups} lookups"
+                " ({rate:.1%}), {size} of {maxsize} series keys".format(
+                    filename=self.csv_filename,
+                    hits=cache_info.hits,
+                    lookups=lookups,
+                    rate=cache_info.hits / lookups if lookups else 0,
+                    size=cache_info.currsize,
+                    maxsize=cache_info.maxsize,
                 )
-                measurements_count += 1
+            )
+        if progress is not None:
+            progress.finish()
+        if stats is not None:
+            batch_writer.stats.merge(
+                stats.seconds, self.skipped_count, self.failed_count
+            )
+
+        duration = time.perf_counter() - started
+        if shared:
+            print(
+                f"Processed {measurements_count} measurements"
+                f" of {self.csv_filename}{format_rate(measurements_count, duration)}"
+            )
+        else:
+            print(
+                f"\nWrote {measurements_count} measurements"
+                f" to {self.cfg_output or 'InfluxDB'}"
+                f"{format_rate(measurements_count, duration)}"
+            )
+            if batch_writer.stats is not None:
+                print(batch_writer.stats.report(measurements_count, duration))
+        return measurements_count
+
+
+def is_retryable(exception):
+    """Returns true if a failed write may succeed when it is retried"""
+    import requests
+    from influxdb.exceptions import InfluxDBClientError, InfluxDBServerError
+
+    if isinstance(exception, InfluxDBServerError):
+        return True
+    if isinstance(exception, InfluxDBClientError):
+        return exception.code in (408, 429)
+    return isinstance(
+        exception, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+    )
+
+
+def split_payload(payload):
+    """Returns the two halves of a line protocol payload
+    with their number of lines"""
+    middle = payload.rfind(b"\n", 0, len(payload) // 2) + 1
+    if middle == 0:
+        middle = payload.find(b"\n") + 1
+    halves = [payload[:middle], payload[middle:]]
+    return [(half, half.count(b"\n")) for half in halves if half]
+
+
+def format_rate(count, duration):
+    """Returns the duration and throughput of a number of measurements"""
+    rate = count / duration if duration else 0
+    return f" in {duration:.2f}s ({rate:.0f} measurements/s)"
+
+
+def expand_paths(paths):
+    """Returns the files of a list of files, directories and glob patterns"""
+    csv_filenames = []
+    for path in paths:
+        if os.path.isdir(path):
+            filenames = sorted(
+                os.path.join(path, filename)
+                for filename in os.listdir(path)
+                if any(fnmatch(filename, pattern) for pattern in CSV_PATTERNS)
+            )
+        elif glob.has_magic(path):
+            filenames = sorted(glob.glob(path, recursive=True))
+        elif os.path.exists(path):
+            filenames = [path]
+        else:
+            raise click.BadParameter(
+                'Path "{path}" does not exist'.format(path=path),
+                param_hint="CSVFILE",
+            )
+        csv_filenames.extend(
+            filename for filename in filenames if os.path.isfile(filename)
+        )
+    return csv_filenames
+
+
+def create_importer(csv_filename, kwargs):
+    """Returns a CsvImporter for a .csv file
+    configured by the commandline options"""
+
+    # Instantiate CsvImporter
+    csv_importer = CsvImporter(csv_filename, kwargs["delimiter"])
+
+    # Handle options
+    if kwargs["server"]:
+        csv_importer.set_server(kwargs["server"])
+    if kwargs["port"]:
+        csv_importer.set_port(kwargs["port"])
+    if kwargs["ssl"]:
+        csv_importer.set_ssl(kwargs["ssl"])
+    if kwargs["user"]:
+        csv_importer.set_user(kwargs["user"])
+    if kwargs["password"]:
+        csv_importer.set_password(kwargs["password"])
+    if kwargs["database"]:
+        csv_importer.set_database(kwargs["database"])
+    if kwargs["measurement"]:
+        csv_importer.set_measurement(kwargs["measurement"])
+    if kwargs["tags_columns"]:
+        csv_importer.set_tags_columns(kwargs["tags_columns"])
+    if kwargs["timestamp_column"]:
+        csv_importer.set_timestamp_column(kwargs["timestamp_column"])
+    if kwargs["timestamp_format"]:
+        csv_importer.set_timestamp_format(kwargs["timestamp_format"])
+    if kwargs["timestamp_timezone"]:
+        csv_importer.set_timestamp_timezone(kwargs["timestamp_timezone"])
+    if kwargs["timestamp_strptime"]:
+        csv_importer.set_timestamp_strptime(kwargs["timestamp_strptime"])
+    csv_importer.set_precision(kwargs["precision"])
+    csv_importer.set_series_cache_size(kwargs["series_cache_size"])
+    if kwargs["sample_rows"]:
+        csv_importer.set_sample_rows(kwargs["sample_rows"])
+    if kwargs["locale"]:
+        csv_importer.set_locale(kwargs["locale"])
+    if kwargs["date_filter"]:
+        csv_importer.set_date_filter(kwargs["date_filter"])
+    if kwargs["column_ignorelist"]:
+        csv_importer.set_column_ignorelist(kwargs["column_ignorelist"])
+
+    if kwargs["batch_size"]:
+        csv_importer.set_batch_size(kwargs["batch_size"])
+    if kwargs["batch_max_age"] is not None:
+        csv_importer.set_batch_max_age(kwargs["batch_max_age"])
+    csv_importer.set_poll_interval(kwargs["poll_interval"])
+    if kwargs["reorder_window"]:
+        csv_importer.set_reorder_window(kwargs["reorder_window"])
+    csv_importer.set_shard_duration(kwargs["shard_duration"])
+    if kwargs["write_concurrency"]:
+        csv_importer.set_write_concurrency(kwargs["write_concurrency"])
+    if kwargs["workers"]:
+        csv_importer.set_workers(kwargs["workers"])
+    if kwargs["checkpoint"]:
+        csv_importer.set_checkpoint(kwargs["checkpoint"])
+    if kwargs["timeout"]:
+        csv_importer.set_timeout(kwargs["timeout"])
+    csv_importer.set_max_retries(kwargs["max_retries"])
+    csv_importer.set_retry_backoff(kwargs["retry_backoff"])
+    if kwargs["target_latency"]:
+        csv_importer.set_target_latency(kwargs["target_latency"])
+    csv_importer.set_gzip_level(kwargs["gzip_level"])
+    if kwargs["pool_size"]:
+        csv_importer.set_pool_size(kwargs["pool_size"])
+    if kwargs["output"]:
+        csv_importer.set_output(kwargs["output"])
+    if kwargs["output_chunk_lines"]:
+        csv_importer.set_output_chunk_lines(kwargs["output_chunk_lines"])
+    if kwargs["metrics_file"]:
+        csv_importer.set_metrics_file(kwargs["metrics_file"])
+    if kwargs["metrics_port"] is not None:
+        csv_importer.set_metrics_port(kwargs["metrics_port"])
+    csv_importer.set_metrics_interval(kwargs["metrics_interval"])
+    csv_importer.set_engine(kwargs["engine"])
+    if kwargs["schema"]:
+        csv_importer.set_schema(kwargs["schema"])
+
+    # Handle toggles
+    csv_importer.set_convert_int_to_float(kwargs["convert_int_to_float"])
+    csv_importer.set_adaptive_batch_size(kwargs["adaptive_batch_size"])
+    csv_importer.set_gzip(kwargs["gzip"])
+    csv_importer.set_keep_alive(kwargs["keep_alive"])
+    csv_importer.set_output_dml(kwargs["output_dml"])
+    csv_importer.set_stats(kwargs["stats"])
+    csv_importer.set_infer_schema(kwargs["infer_schema"])
+    csv_importer.set_follow(kwargs["follow"])
+
+    return csv_importer
+
+
+def move_aside(csv_filename, directory=None, default="done"):
+    """Moves a file into a directory which is by default a subdirectory
+    next to the file and keeps existing files of the same name"""
+    if directory is None:
+        directory = os.path.join(os.path.dirname(csv_filename), default)
+    os.makedirs(directory, exist_ok=True)
+    name = os.path.basename(csv_filename)
+    target = os.path.join(directory, name)
+    number = 0
+    while os.path.exists(target):
+        number += 1
+        target = os.path.join(
+            directory, "{name}.{number}".format(name=name, number=number)
+        )
+    os.replace(csv_filename, target)
+    logging.debug(
+        'Moved "{source}" to "{target}"'.format(source=csv_filename, target=target)
+    )
+    return target
+
+
+def watch_directories(directories, kwargs, stop=None):
+    """Writes the .csv files which arrive in directories to InfluxDB
+    or the line protocol file through one warm connection and batch writer
+    until the watch is interrupted or stopped and moves finished files aside"""
+    stop = stop or threading.Event()
+    connection_importer = None
+    batch_writer = None
+    sizes = {}
+    logging.info("Watch {directories}".format(directories=", ".join(directories)))
+    try:
+        while True:
+            # Files are imported once their size is unchanged for a poll interval
+            ready = []
+            for csv_filename in expand_paths(directories):
+                try:
+                    size = os.path.getsize(csv_filename)
+                except FileNotFoundError:
+                    continue
+                if sizes.get(csv_filename) == size:
+                    ready.append(csv_filename)
+                    del sizes[csv_filename]
+                else:
+                    sizes[csv_filename] = size
+            if ready:
+                if batch_writer is None:
+                    # The connection does not depend on any of the watched files
+                    connection_importer = create_importer(os.devnull, kwargs)
+                    if kwargs["output"]:
+                        connection_importer.open_output()
+                    else:
+                        connection_importer.connect()
+                    batch_writer = connection_importer.create_batch_writer()
+                finished = []
+                for csv_filename in ready:
+                    try:
+                        create_importer(csv_filename, kwargs).write_data(batch_writer)
+                        finished.append((csv_filename, kwargs["done_dir"], "done"))
+                    except FILE_ERRORS as exception:
+                        # Failed writes end the watch instead of failing files
+                        if batch_writer.write_failed:
+                            raise
+                        logging.error(
+                            'Import of "{filename}" failed: {exception}'.format(
+                                filename=csv_filename, exception=exception
+                            )
+                        )
+                        finished.append((csv_filename, kwargs["failed_dir"], "failed"))
+                # Files are only moved aside once all their points are written
+                batch_writer.drain()
+                for csv_filename, directory, default in finished:
+                    move_aside(csv_filename, directory, default)
+                    # The next file under the same path starts from the beginning
+                    if batch_writer.checkpoint is not None:
+                        batch_writer.checkpoint.forget(csv_filename)
+            try:
+                if stop.wait(kwargs["poll_interval"]):
+                    return
+            except KeyboardInterrupt:
+                return
+    finally:
+        if batch_writer is not None:
+            try:
+                batch_writer.close()
+            finally:
+                connection_importer.close_output()
+
+
+def write_files(csv_filenames, kwargs, stop=None):
+    """Writes multiple .csv files to InfluxDB or the line protocol file
+    through a shared connection and batch writer whereby followed files
+    share one stop event"""
+    stop = stop or threading.Event()
+    connection_importer = create_importer(csv_filenames[0], kwargs)
+    if kwargs["output"]:
+        connection_importer.open_output()
+    else:
+        connection_importer.connect()
+    batch_writer = connection_importer.create_batch_writer()
+
+    def write_file(csv_filename):
+        csv_importer = create_importer(csv_filename, kwargs)
+        csv_importer.follow_stop = stop
+        return csv_importer.write_data(batch_writer)
+
+    started = time.perf_counter()
+    try:
+        if kwargs["parallel_files"] > 1:
+            with ThreadPoolExecutor(max_workers=kwargs["parallel_files"]) as executor:
+                futures = [
+                    executor.submit(write_file, csv_filename)
+                    for csv_filename in csv_filenames
+                ]
+                try:
+                    for future in futures:
+                        future.result()
+                except BaseException:
+                    # Followers only notice an interrupt through the stop event
+                    stop.set()
+                    for future in futures:
+                        future.cancel()
+                    raise
+        else:
+            for csv_filename in csv_filenames:
+                write_file(csv_filename)
+    finally:
+        try:
+            batch_writer.close()
+        finally:
+            connection_importer.close_output()
 
-        print(f"\nWrote {measurements_count} measurements to InfluxDB")
+    measurements_count = batch_writer.points_count
+    duration = time.perf_counter() - started
+    print(
+        f"\nWrote {measurements_count} measurements of {len(csv_filenames)} files"
+        f" to {kwargs['output'] or 'InfluxDB'}"
+        f"{format_rate(measurements_count, duration)}"
+    )
+    if batch_writer.stats is not None:
+        print(batch_writer.stats.report(measurements_count, duration))
 
 
 @click.command()
 @click.argument(
     "csvfile",
-    type=click.Path(exists=True),
+    nargs=-1,
+    required=True,
 )
 @click.option(
     "--delimiter",
@@ -397,13 +3430,35 @@ class CsvImporter(object):
         epoch = epoch / unix timestamp \
         \b \
         datetime = normal date and/or time notation \
-        raw = raw epoch timestamp, do not convert",
+        raw = raw epoch timestamp of the precision, do not convert",
+)
+@click.option(
+    "--precision",
+    default="ns",
+    type=click.Choice(list(PRECISIONS)),
+    help="Precision of the written timestamps; timestamps are truncated \
+        to it and raw timestamps are read in it (Default: ns)",
 )
 @click.option(
     "--timestamp-timezone",
     default="UTC",
     help="Timezone of the timestamp column",
 )
+@click.option(
+    "--timestamp-strptime",
+    help="Format of the timestamp column in strptime notation \
+        e.g. %Y-%m-%d %H:%M:%S; \
+        if option is not set, the format is detected from the first rows \
+        unless they leave the order of day and month ambiguous; \
+        implies the datetime timestamp format",
+)
+@click.option(
+    "--sample-rows",
+    default=DEFAULT_SAMPLE_ROWS,
+    type=click.IntRange(min=1),
+    help="Number of rows to sample for the detection \
+        of the timestamp format (Default: 1000)",
+)
 @click.option(
     "--locale",
     help="Locale for ctype, numeric and monetary \
@@ -413,7 +3468,9 @@ class CsvImporter(object):
     "--date-filter",
     help="Select only rows with a specific date \
         in the timestamp column for import \
-        e.g. 2020-01-01",
+        e.g. 2020-01-01; \
+        ranges and lists of dates are supported \
+        e.g. 2020-01-01..2020-01-31,2020-03-01",
 )
 @click.option(
     "--column-ignorelist",
@@ -421,16 +3478,239 @@ class CsvImporter(object):
         e.g. col1,col2,col3",
 )
 @click.option(
-    "--convert-int-to-float",
+    "--convert-int-to-float/--no-convert-int-to-float",
+    default=True,
+    help="Convert integer values to float; otherwise integer and boolean \
+        columns are written as integer and boolean fields \
+        (Default: --convert-int-to-float)",
+)
+@click.option(
+    "--schema",
+    type=click.Path(exists=True, dir_okay=False),
+    help="JSON file which maps columns to float, integer, boolean, string, \
+        tag, timestamp or ignore; the types of all other columns \
+        are inferred from the sample rows",
+)
+@click.option(
+    "--infer-schema",
+    is_flag=True,
+    help="Infer the type of every column from the sample rows \
+        and pin it so that the type of a field never changes",
+)
+@click.option(
+    "--engine",
+    default="row",
+    type=click.Choice(["row", "columnar"]),
+    help="Transform rows one by one or chunks of rows column by column; \
+        columnar converts every numeric column of a chunk at once \
+        and keeps columns without any number as strings (Default: row)",
+)
+@click.option(
+    "--batch-size",
+    default=DEFAULT_BATCH_SIZE,
+    type=click.IntRange(min=1),
+    help="Number of measurements to send with one request; \
+        1 sends every measurement with its own request (Default: 5000)",
+)
+@click.option(
+    "--batch-max-age",
+    type=click.FloatRange(min=0),
+    help="Maximum age of a batch in seconds before it is sent",
+)
+@click.option(
+    "--series-cache-size",
+    default=DEFAULT_SERIES_CACHE_SIZE,
+    type=click.IntRange(min=0),
+    help="Number of recently used tag combinations whose encoded series key \
+        is reused; 0 disables the cache (Default: 10000)",
+)
+@click.option(
+    "--reorder-window",
+    type=click.IntRange(min=1),
+    help="Number of measurements which are held and written grouped by \
+        shard group and series and sorted by time; batches are split \
+        at the boundaries of shard groups; measurements without timestamp \
+        are written first in their original order",
+)
+@click.option(
+    "--shard-duration",
+    default="7d",
+    help="Shard group duration of the retention policy at which \
+        reordered batches are split e.g. 1h, 1d or 7d (Default: 7d)",
+)
+@click.option(
+    "--follow",
+    is_flag=True,
+    help="Keep the .csv file open after the import and write appended lines \
+        until the import is interrupted; rotated and truncated files \
+        are reopened",
+)
+@click.option(
+    "--poll-interval",
+    default=DEFAULT_POLL_INTERVAL,
+    type=click.FloatRange(min=0, min_open=True),
+    help="Interval in seconds in which a followed file is checked \
+        for appended lines and watched directories for new files; \
+        it is also the batch max age of a followed file \
+        if --batch-max-age is not set (Default: 1.0)",
+)
+@click.option(
+    "--watch",
+    is_flag=True,
+    help="Watch the CSVFILE directories and write every arriving .csv file \
+        through one connection until the watch is interrupted; \
+        files are imported once their size is unchanged \
+        for a poll interval",
+)
+@click.option(
+    "--done-dir",
+    type=click.Path(file_okay=False),
+    help="Directory into which watched files are moved after the import \
+        (Default: done next to the file)",
+)
+@click.option(
+    "--failed-dir",
+    type=click.Path(file_okay=False),
+    help="Directory into which watched files are moved if they cannot be \
+        parsed (Default: failed next to the file)",
+)
+@click.option(
+    "--write-concurrency",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Number of batches to send concurrently \
+        while the next rows are parsed (Default: 1)",
+)
+@click.option(
+    "--workers",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Number of processes to parse byte ranges of the .csv file; \
+        values must not contain line breaks (Default: 1)",
+)
+@click.option(
+    "--parallel-files",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Number of .csv files to process at once (Default: 1)",
+)
+@click.option(
+    "--checkpoint",
+    type=click.Path(dir_okay=False),
+    help="File to record the position of written rows \
+        so that an interrupted import can be resumed; \
+        files which changed since start from the beginning",
+)
+@click.option(
+    "--timeout",
+    type=click.FloatRange(min=0, min_open=True),
+    help="Timeout of requests to InfluxDB in seconds",
+)
+@click.option(
+    "--max-retries",
+    default=DEFAULT_MAX_RETRIES,
+    type=click.IntRange(min=0),
+    help="Number of retries of a failed write (Default: 5)",
+)
+@click.option(
+    "--retry-backoff",
+    default=DEFAULT_RETRY_BACKOFF,
+    type=click.FloatRange(min=0),
+    help="Initial delay in seconds before a failed write is retried; \
+        it doubles with every retry (Default: 0.5)",
+)
+@click.option(
+    "--adaptive-batch-size",
+    is_flag=True,
+    default=False,
+    help="Shrink batches on timeouts or too large requests \
+        and grow them while the write latency stays below the target",
+)
+@click.option(
+    "--target-latency",
+    default=DEFAULT_TARGET_LATENCY,
+    type=click.FloatRange(min=0, min_open=True),
+    help="Write latency in seconds up to which \
+        adaptive batches grow (Default: 1.0)",
+)
+@click.option(
+    "--gzip",
     is_flag=True,
+    default=False,
+    help="Compress write requests with gzip",
+)
+@click.option(
+    "--gzip-level",
+    default=DEFAULT_GZIP_LEVEL,
+    type=click.IntRange(min=1, max=9),
+    help="Compression level of gzip compressed write requests; \
+        1 is fastest, 9 is smallest (Default: 6)",
+)
+@click.option(
+    "--keep-alive/--no-keep-alive",
     default=True,
-    help="Convert integer values to float",
+    help="Reuse HTTP connections to InfluxDB (Default: --keep-alive)",
+)
+@click.option(
+    "--pool-size",
+    type=click.IntRange(min=1),
+    help="Number of HTTP connections kept open to InfluxDB \
+        (Default: 10 or --write-concurrency if larger)",
+)
+@click.option(
+    "--output",
+    type=click.Path(dir_okay=False, writable=True),
+    help="Write data as line protocol into a file instead of InfluxDB; \
+        the file is gzip compressed with --gzip or a .gz extension",
+)
+@click.option(
+    "--output-chunk-lines",
+    type=click.IntRange(min=1),
+    help="Number of measurements after which a new output file \
+        numbered like FILE-0001.lp is started",
+)
+@click.option(
+    "--output-dml",
+    is_flag=True,
+    default=False,
+    help="Start output files with the # DML header of influx -import",
+)
+@click.option(
+    "--stats",
+    is_flag=True,
+    default=False,
+    help="Print throughput, time per stage, batch latency percentiles \
+        and skipped or failed rows after the import",
+)
+@click.option(
+    "--metrics-file",
+    type=click.Path(dir_okay=False, writable=True),
+    help="File to export live metrics into in the Prometheus text format \
+        e.g. for the textfile collector of the node exporter",
+)
+@click.option(
+    "--metrics-port",
+    type=click.IntRange(min=0, max=65535),
+    help="Port of a local HTTP /metrics endpoint \
+        which serves live metrics in the Prometheus text format",
+)
+@click.option(
+    "--metrics-interval",
+    default=DEFAULT_METRICS_INTERVAL,
+    type=click.FloatRange(min=0, min_open=True),
+    help="Interval in seconds in which the metrics file is updated \
+        (Default: 10.0)",
 )
 @click.option(
     "--print-columns",
     is_flag=True,
     help="Print all column names in pretty json format",
 )
+@click.option(
+    "--print-schema",
+    is_flag=True,
+    help="Print the type of every column in pretty json format",
+)
 @click.option(
     "--print-rows",
     is_flag=True,
@@ -447,7 +3727,10 @@ class CsvImporter(object):
     help="Enable verbose logging output",
 )
 def cli(*args, **kwargs):
-    """Commandline interface for InfluxDB / CSV Importer"""
+    """Commandline interface for InfluxDB / CSV Importer
+
+    CSVFILE can be given multiple times as file, directory or glob pattern;
+    gzip, bzip2, xz and zstd compressed files are decompressed on the fly"""
 
     # Configure logging
     log_format = "%(levelname)s: %(message)s"
@@ -456,51 +3739,59 @@ def cli(*args, **kwargs):
     else:
         logging.basicConfig(format=log_format)
 
-    # Instantiate CsvImporter
-    csv_importer = CsvImporter(kwargs["csvfile"], kwargs["delimiter"])
+    try:
+        parse_duration(kwargs["shard_duration"])
+    except ValueError as exception:
+        raise click.BadParameter(str(exception), param_hint="--shard-duration")
 
-    # Handle options
-    if kwargs["server"]:
-        csv_importer.set_server(kwargs["server"])
-    if kwargs["port"]:
-        csv_importer.set_port(kwargs["port"])
-    if kwargs["ssl"]:
-        csv_importer.set_ssl(kwargs["ssl"])
-    if kwargs["user"]:
-        csv_importer.set_user(kwargs["user"])
-    if kwargs["password"]:
-        csv_importer.set_password(kwargs["password"])
-    if kwargs["database"]:
-        csv_importer.set_database(kwargs["database"])
-    if kwargs["measurement"]:
-        csv_importer.set_measurement(kwargs["measurement"])
-    if kwargs["tags_columns"]:
-        csv_importer.set_tags_columns(kwargs["tags_columns"])
-    if kwargs["timestamp_column"]:
-        csv_importer.set_timestamp_column(kwargs["timestamp_column"])
-    if kwargs["timestamp_format"]:
-        csv_importer.set_timestamp_format(kwargs["timestamp_format"])
-    if kwargs["timestamp_timezone"]:
-        csv_importer.set_timestamp_timezone(kwargs["timestamp_timezone"])
-    if kwargs["locale"]:
-        csv_importer.set_locale(kwargs["locale"])
-    if kwargs["date_filter"]:
-        csv_importer.set_date_filter(kwargs["date_filter"])
-    if kwargs["column_ignorelist"]:
-        csv_importer.set_column_ignorelist(kwargs["column_ignorelist"])
+    if kwargs["watch"]:
+        if kwargs["follow"]:
+            raise click.BadParameter(
+                "Watched files cannot be followed", param_hint="--follow"
+            )
+        for path in kwargs["csvfile"]:
+            if not os.path.isdir(path):
+                raise click.BadParameter(
+                    'Watched path "{path}" is no directory'.format(path=path),
+                    param_hint="CSVFILE",
+                )
+        # Stop watching on termination like on an interrupt
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        watch_directories(kwargs["csvfile"], kwargs)
+        return
 
-    # Handle toggles
-    csv_importer.set_convert_int_to_float(kwargs["convert_int_to_float"])
+    csv_filenames = expand_paths(kwargs["csvfile"])
+    if not csv_filenames:
+        raise click.BadParameter("No .csv files found", param_hint="CSVFILE")
 
     # Handle actions
-    if kwargs["print_columns"]:
-        columns = csv_importer.print_columns()
-        click.echo(columns)
-    if kwargs["print_rows"]:
-        rows = csv_importer.print_rows()
-        click.echo(rows)
-    if kwargs["write_data"]:
-        csv_importer.write_data()
+    if kwargs["print_columns"] or kwargs["print_schema"] or kwargs["print_rows"]:
+        for csv_filename in csv_filenames:
+            csv_importer = create_importer(csv_filename, kwargs)
+            if kwargs["print_columns"]:
+                columns = csv_importer.print_columns()
+                click.echo(columns)
+            if kwargs["print_schema"]:
+                schema = csv_importer.print_schema()
+                click.echo(schema)
+            if kwargs["print_rows"]:
+                for rows in csv_importer.iter_print_rows():
+                    click.echo(rows, nl=False)
+                click.echo()
+    if kwargs["write_data"] or kwargs["output"]:
+        if kwargs["follow"] and kwargs["parallel_files"] < len(csv_filenames):
+            raise click.BadParameter(
+                "Following multiple files needs --parallel-files"
+                " of at least the number of files",
+                param_hint="--follow",
+            )
+        if kwargs["follow"]:
+            # Stop following on termination like on an interrupt
+            signal.signal(signal.SIGTERM, signal.default_int_handler)
+        if len(csv_filenames) == 1:
+            create_importer(csv_filenames[0], kwargs).write_data()
+        else:
+            write_files(csv_filenames, kwargs)
 
 
 if __name__ == "__main__":
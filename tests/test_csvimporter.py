@@ -1,15 +1,52 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import bz2
+import gzip
+import io
+import logging
+import lzma
 import os
+import pickle
+import threading
+import time
 import unittest
+import urllib.request
 from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from tempfile import NamedTemporaryFile
 
+import click
 import pytest
+import requests
+from influxdb.exceptions import InfluxDBClientError, InfluxDBServerError
 from pytz import timezone
 
-from csvimporter import CsvImporter
+from csvimporter import (
+    AdaptiveBatchSize,
+    BatchWriter,
+    Checkpoint,
+    ColumnarRowPlan,
+    CsvImporter,
+    DateFilter,
+    FollowReader,
+    LineProtocolEncoder,
+    LineProtocolFile,
+    Metrics,
+    Progress,
+    ReorderBuffer,
+    RowPlan,
+    Stats,
+    TimestampParser,
+    cli,
+    detect_compression,
+    expand_paths,
+    open_csv,
+    parse_duration,
+    split_payload,
+    watch_directories,
+    write_files,
+)
 
 FIXTURES_DIR = os.path.abspath("tests/fixtures")
 
@@ -42,6 +79,33 @@ def test_match_date_negativ(epoch_timestamp, date_str):
     assert CsvImporter.match_date(epoch_timestamp, date_str) is False
 
 
+@pytest.mark.parametrize(
+    "date_filter,epoch_timestamp,expected",
+    [
+        # 2016-12-01T00:00:00+00:00
+        ("2016-12-01", 1480550400, True),
+        # 2016-11-30T23:59:59+00:00
+        ("2016-12-01", 1480550399, False),
+        # 2016-12-31T23:59:59+00:00
+        ("2016-12-01..2016-12-31", 1483228799, True),
+        # 2017-01-01T00:00:00+00:00
+        ("2016-12-01..2016-12-31", 1483228800, False),
+        # 2016-12-15T12:00:00+00:00
+        ("2016-11-01,2016-12-15", 1481803200, True),
+        ("2016-11-01,2016-12-14", 1481803200, False),
+        ("2016-12-10..2016-12-20,2016-12-01..2016-12-15", 1481803200, True),
+    ],
+)
+def test_date_filter(date_filter, epoch_timestamp, expected):
+    assert DateFilter(date_filter)(epoch_timestamp * 1000000000) is expected
+
+
+@pytest.mark.parametrize("date_filter", ["", "2016-12-31..2016-12-01", "31.12.2016"])
+def test_date_filter_invalid(date_filter):
+    with pytest.raises(ValueError):
+        DateFilter(date_filter)
+
+
 @pytest.mark.parametrize(
     "date_str,fmt,tz,expected",
     [
@@ -98,6 +162,105 @@ def test_convert_into_utc_timestamp(date_str, fmt, tz, expected):
     assert CsvImporter.convert_into_utc_timestamp(date_str, fmt, tz) == expected
 
 
+@pytest.mark.parametrize(
+    "samples,fmt,tz,expected_detected,expected",
+    [
+        # Winterzeit Europa/Berlin
+        (["2016-11-04 07:43:19"], "datetime", "Europe/Berlin", "iso", 1478241799),
+        (["14.11.2016 07:43"], "datetime", "UTC", "%d.%m.%Y %H:%M", 1479109380),
+        # Day and month order
+        (
+            ["05.01.2020 10:00:00", "13.01.2020 10:00:00"],
+            "datetime",
+            "UTC",
+            "%d.%m.%Y %H:%M:%S",
+            1578218400,
+        ),
+        (["01/13/2020", "01/05/2020"], "datetime", "UTC", "%m/%d/%Y", 1578873600),
+        (["01/05/2020"], "datetime", "UTC", None, 1578182400),
+        (["05.01.2020"], "datetime", "UTC", None, 1588291200),
+        # Sommerzeit Europe/Berlin
+        (["2016-09-02T10:00:11"], "datetime", "Europe/Berlin", "iso", 1472803211),
+        (["2016-09-02T10:00:11+02:00"], "datetime", "UTC", "iso", 1472803211),
+        # Epoch units
+        (["1472803211"], "epoch", "UTC", "s", 1472803211),
+        (["1472803211000"], "epoch", "UTC", "ms", 1472803211),
+        (["1472803211000000"], "epoch", "UTC", "us", 1472803211),
+        (["1472803211000000000"], "epoch", "UTC", "ns", 1472803211),
+        (["1472803211.5"], "epoch", "UTC", "s", 1472803211.5),
+    ],
+)
+def test_timestamp_parser(samples, fmt, tz, expected_detected, expected):
+    timestamp_parser = TimestampParser(fmt, tz)
+    timestamp_parser.detect(samples)
+    assert timestamp_parser.detected == expected_detected
+    assert timestamp_parser(samples[0]) == int(expected * 1000000000)
+
+
+@pytest.mark.parametrize(
+    "samples,fmt,precision,expected",
+    [
+        (["1472803211"], "epoch", "ms", 1472803211000),
+        (["1472803211.5"], "epoch", "ms", 1472803211500),
+        (["1472803211123456789"], "epoch", "s", 1472803211),
+        (["1472803211123456"], "epoch", "ms", 1472803211123),
+        (["1472803211123"], "epoch", "u", 1472803211123000),
+        (["2016-09-02T08:00:11.123456"], "datetime", "ms", 1472803211123),
+        (["2016-09-02T10:00:11+02:00"], "datetime", "s", 1472803211),
+        (["1472803211123"], "raw", "ms", 1472803211123),
+    ],
+)
+def test_timestamp_parser_precision(samples, fmt, precision, expected):
+    timestamp_parser = TimestampParser(fmt, "UTC", precision=precision)
+    timestamp_parser.detect(samples)
+    assert timestamp_parser(samples[0]) == expected
+
+
+def test_write_data_with_precision(tmp_path):
+    csv_path = tmp_path / "precision.csv"
+    csv_path.write_text("ts,v\n1472803211123,1\n1472716811000,2\n")
+    output = tmp_path / "output.lp"
+    csv_importer = CsvImporter(str(csv_path))
+    csv_importer.set_measurement("m")
+    csv_importer.set_timestamp_column("ts")
+    csv_importer.set_timestamp_format("raw")
+    csv_importer.set_column_ignorelist("ts")
+    csv_importer.set_precision("ms")
+    csv_importer.set_date_filter("2016-09-02")
+    csv_importer.set_output(str(output))
+    csv_importer.write_data()
+    assert output.read_text() == 'm v="1" 1472803211123\n'
+
+
+def test_timestamp_parser_matches_convert_into_utc_timestamp():
+    timestamp_parser = TimestampParser("datetime", "Europe/Berlin")
+    timestamp_parser.detect(["2016-03-27 01:00:00"])
+    for hour in range(24 * 2):
+        for minute in (0, 14, 15, 59):
+            value = "2016-03-{day} {hour:02d}:{minute:02d}:00".format(
+                day=26 + hour // 24, hour=hour % 24, minute=minute
+            )
+            expected = LineProtocolEncoder.to_nanoseconds(
+                CsvImporter.convert_into_utc_timestamp(
+                    value, "datetime", "Europe/Berlin"
+                )
+            )
+            assert timestamp_parser(value) == expected
+
+
+def test_timestamp_parser_strptime_and_fallback():
+    timestamp_parser = TimestampParser("epoch", "UTC", "%d/%m/%Y %H:%M:%S")
+    assert timestamp_parser("02/09/2016 08:00:11") == 1472803211000000000
+    assert timestamp_parser.fallback_count == 0
+    assert timestamp_parser("2016-09-02 08:00:11") == 1472803211000000000
+    assert timestamp_parser.fallback_count == 1
+
+
+def test_timestamp_parser_raw():
+    timestamp_parser = TimestampParser("raw")
+    assert timestamp_parser("1718109826000000000") == 1718109826000000000
+
+
 @pytest.mark.parametrize(
     "data,expected,tags_columns",
     [
@@ -121,6 +284,1060 @@ def test_convert_int_to_float(data, expected, tags_columns):
     assert CsvImporter.convert_int_to_float(data, tags_columns) == expected
 
 
+def test_batch_writer_flushes_full_batches():
+    batches = []
+    batch_writer = BatchWriter(lambda *batch: batches.append(batch), batch_size=2)
+    for point in range(5):
+        batch_writer.add(b"m", b"v=%d" % point, point)
+    assert batches == [(b"m v=0 0\nm v=1 1\n", 2), (b"m v=2 2\nm v=3 3\n", 2)]
+    batch_writer.flush()
+    assert batches[-1] == (b"m v=4 4\n", 1)
+    assert batch_writer.batches_count == 3
+    assert batch_writer.points_count == 5
+
+
+def test_batch_writer_flushes_expired_batches():
+    batches = []
+    batch_writer = BatchWriter(
+        lambda *batch: batches.append(batch), batch_size=100, max_age=0
+    )
+    batch_writer.add(b"m", b"v=1")
+    batch_writer.add(b"m", b"v=2")
+    assert batches == [(b"m v=1\n", 1), (b"m v=2\n", 1)]
+
+
+def test_batch_writer_sends_concurrently():
+    batches = []
+    batch_writer = BatchWriter(
+        lambda *batch: batches.append(batch), batch_size=2, concurrency=3
+    )
+    for point in range(9):
+        batch_writer.add(b"m", b"v=%d" % point)
+    batch_writer.close()
+    assert sorted(batches) == sorted(
+        [(b"m v=%d\nm v=%d\n" % (point, point + 1), 2) for point in (0, 2, 4, 6)]
+        + [(b"m v=8\n", 1)]
+    )
+    assert batch_writer.points_count == 9
+
+
+def test_batch_writer_stops_on_error():
+    def send(payload, count):
+        raise IOError("connection refused")
+
+    batch_writer = BatchWriter(send, batch_size=1, concurrency=2)
+    with pytest.raises(IOError, match="connection refused"):
+        for point in range(100):
+            batch_writer.add(b"m", b"v=%d" % point)
+        batch_writer.close()
+    assert batch_writer.points_count == 0
+
+
+def test_adaptive_batch_size():
+    batch_sizer = AdaptiveBatchSize(1000, target_latency=1.0)
+    batch_sizer.observe(1000, 2.0)
+    assert batch_sizer.size == 1000
+    batch_sizer.observe(999, 0.1)
+    assert batch_sizer.size == 1000
+    batch_sizer.observe(1000, 0.1)
+    assert batch_sizer.size == 1250
+    for _ in range(20):
+        batch_sizer.observe(batch_sizer.size, 0.1)
+    assert batch_sizer.size == 4000
+    for _ in range(20):
+        batch_sizer.shrink()
+    assert batch_sizer.size == 10
+
+
+def test_split_payload():
+    assert split_payload(b"a\nb\nc\nd\n") == [(b"a\nb\n", 2), (b"c\nd\n", 2)]
+    assert split_payload(b"a\nb\n") == [(b"a\n", 1), (b"b\n", 1)]
+
+
+class FakeConnection(object):
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.lines = []
+
+    def write_points(self, points, time_precision, protocol):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.time_precision = time_precision
+        self.lines.extend(points[0].split("\n"))
+
+    def request(self, url, method, params, data, expected_response_code, headers):
+        self.headers = headers
+        self.write_points(
+            [gzip.decompress(data).decode("utf-8").rstrip()],
+            params["precision"],
+            "line",
+        )
+
+
+def test_write_points_retries():
+    csv_importer = CsvImporter(os.path.join(FIXTURES_DIR, "simple.csv"))
+    csv_importer.set_retry_backoff(0)
+    csv_importer.influxdb_connection = FakeConnection(
+        [InfluxDBServerError("down"), InfluxDBClientError("busy", 429)]
+    )
+    csv_importer.write_points(b"m v=1\n", 1)
+    assert csv_importer.influxdb_connection.lines == ["m v=1"]
+    assert csv_importer.influxdb_connection.time_precision == "n"
+
+
+@pytest.mark.parametrize("gzip_toggle", [True, False])
+def test_write_points_precision(gzip_toggle):
+    csv_importer = CsvImporter(os.path.join(FIXTURES_DIR, "simple.csv"))
+    csv_importer.set_gzip(gzip_toggle)
+    csv_importer.set_precision("s")
+    csv_importer.influxdb_connection = FakeConnection([])
+    csv_importer.write_points(b"m v=1 1472803211\n", 1)
+    assert csv_importer.influxdb_connection.time_precision == "s"
+
+
+def test_write_points_without_client_retries():
+    requests_count = []
+
+    class SlowHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            requests_count.append(1)
+            time.sleep(0.3)
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        csv_importer = CsvImporter(os.path.join(FIXTURES_DIR, "simple.csv"))
+        csv_importer.set_server("127.0.0.1")
+        csv_importer.set_port(server.server_address[1])
+        csv_importer.set_timeout(0.1)
+        csv_importer.set_max_retries(0)
+        csv_importer.connect()
+        with pytest.raises(requests.exceptions.Timeout):
+            csv_importer.write_points(b"m v=1\n", 1)
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert len(requests_count) == 1
+
+
+def test_write_points_gzip():
+    csv_importer = CsvImporter(os.path.join(FIXTURES_DIR, "simple.csv"))
+    csv_importer.set_gzip(True)
+    csv_importer.set_keep_alive(False)
+    csv_importer.set_port(8086)
+    csv_importer.connect()
+    csv_importer.influxdb_connection = FakeConnection([])
+    csv_importer.write_points(b"m v=1\nm v=2\n", 2)
+    assert csv_importer.influxdb_connection.lines == ["m v=1", "m v=2"]
+    assert csv_importer.influxdb_connection.headers["Content-Encoding"] == "gzip"
+    assert csv_importer.influxdb_connection.headers["Connection"] == "close"
+
+
+def test_write_points_gives_up():
+    csv_importer = CsvImporter(os.path.join(FIXTURES_DIR, "simple.csv"))
+    csv_importer.set_retry_backoff(0)
+    csv_importer.set_max_retries(1)
+    csv_importer.influxdb_connection = FakeConnection(
+        [InfluxDBServerError("down"), InfluxDBServerError("still down")]
+    )
+    with pytest.raises(InfluxDBServerError, match="still down"):
+        csv_importer.write_points(b"m v=1\n", 1)
+    csv_importer.influxdb_connection = FakeConnection(
+        [InfluxDBClientError("bad request", 400)]
+    )
+    with pytest.raises(InfluxDBClientError, match="bad request"):
+        csv_importer.write_points(b"m v=1\n", 1)
+
+
+def test_write_points_splits_too_large_batches():
+    csv_importer = CsvImporter(os.path.join(FIXTURES_DIR, "simple.csv"))
+    csv_importer.set_adaptive_batch_size(True)
+    batch_writer = csv_importer.create_batch_writer()
+    batch_writer.close()
+    csv_importer.influxdb_connection = FakeConnection(
+        [InfluxDBClientError("too large", 413)]
+    )
+    csv_importer.write_points(b"m v=1\nm v=2\nm v=3\n", 3)
+    assert csv_importer.influxdb_connection.lines == ["m v=1", "m v=2", "m v=3"]
+    assert csv_importer.batch_sizer.size == 2500
+
+
+def test_line_protocol_file_chunks(tmp_path):
+    path = str(tmp_path / "export.lp.gz")
+    output_file = LineProtocolFile(path, 1, chunk_lines=2, header=b"# DML\n")
+    output_file.write(b"m v=1\nm v=2\nm v=3\n", 3)
+    output_file.write(b"m v=4\n", 1)
+    output_file.write(b"m v=5\n", 1)
+    output_file.close()
+    assert output_file.paths == [
+        str(tmp_path / "export-0001.lp.gz"),
+        str(tmp_path / "export-0002.lp.gz"),
+        str(tmp_path / "export-0003.lp.gz"),
+    ]
+    contents = []
+    for chunk_path in output_file.paths:
+        with gzip.open(chunk_path, "rb") as chunk_file:
+            contents.append(chunk_file.read())
+    assert contents == [
+        b"# DML\nm v=1\nm v=2\n",
+        b"# DML\nm v=3\nm v=4\n",
+        b"# DML\nm v=5\n",
+    ]
+
+
+def test_write_data_into_output_file(tmp_path):
+    path = str(tmp_path / "export.lp")
+    csv_importer = CsvImporter(os.path.join(FIXTURES_DIR, "simple.csv"))
+    csv_importer.set_measurement("m")
+    csv_importer.set_database("db")
+    csv_importer.set_output(path)
+    csv_importer.set_output_dml(True)
+    assert csv_importer.write_data() == 2
+    assert csv_importer.influxdb_connection is None
+    with open(path, "rb") as output_file:
+        assert output_file.read() == (
+            b"# DML\n# CONTEXT-DATABASE: db\n"
+            b'm col1="a",col2="b"\nm col1="c",col2="d"\n'
+        )
+
+
+def test_batch_writer_flushes_expired_batch_without_new_points():
+    batches = []
+    batch_writer = BatchWriter(lambda payload, count: batches.append(count), 10, 0)
+    batch_writer.flush_if_expired()
+    batch_writer.add(b"m", b"v=1")
+    batch_writer.flush_if_expired()
+    assert batches == [1]
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_follow_reader(tmp_path):
+    csv_path = tmp_path / "follow.csv"
+    csv_path.write_bytes(b"a,b\n1,2\n")
+    rows = []
+    with open(csv_path, "rb") as csv_file:
+        csv_file.readline()
+        csv_reader = FollowReader(
+            csv_file, str(csv_path), ["a", "b"], line=1, poll_interval=0.01
+        )
+        thread = threading.Thread(target=lambda: rows.extend(csv_reader))
+        thread.start()
+        try:
+            wait_for(lambda: rows == [["1", "2"]])
+            with open(csv_path, "ab") as appended_file:
+                appended_file.write(b"3,")
+                appended_file.flush()
+                time.sleep(0.05)
+                appended_file.write(b"4\n")
+            wait_for(lambda: len(rows) == 2)
+            # Truncated files are read from the beginning without the header
+            csv_path.write_bytes(b"a,b\n5,6\n")
+            wait_for(lambda: len(rows) == 3)
+            # Rotated files are reopened
+            os.rename(csv_path, tmp_path / "follow.csv.1")
+            csv_path.write_bytes(b"a,b\n7,8\n9,10\n")
+            wait_for(lambda: len(rows) == 5)
+        finally:
+            csv_reader.stop.set()
+            thread.join()
+    assert rows == [["1", "2"], ["3", "4"], ["5", "6"], ["7", "8"], ["9", "10"]]
+    assert csv_reader.read_position() == {"offset": 13, "line": 3}
+
+
+def test_write_data_follows_file(tmp_path):
+    csv_path = tmp_path / "follow.csv"
+    csv_path.write_bytes(b"a,b\n1,2\n")
+    batches = []
+    batch_writer = BatchWriter(
+        lambda payload, count: batches.append(payload), 100, max_age=0
+    )
+    csv_importer = CsvImporter(str(csv_path))
+    csv_importer.set_measurement("m")
+    csv_importer.set_follow(True)
+    csv_importer.set_poll_interval(0.01)
+    thread = threading.Thread(target=csv_importer.write_data, args=(batch_writer,))
+    thread.start()
+    try:
+        wait_for(lambda: batches == [b'm a="1",b="2"\n'])
+        with open(csv_path, "ab") as appended_file:
+            appended_file.write(b"3,4\n")
+        wait_for(lambda: len(batches) == 2)
+    finally:
+        csv_importer.follow_stop.set()
+        thread.join()
+    batch_writer.close()
+    assert batches == [b'm a="1",b="2"\n', b'm a="3",b="4"\n']
+
+
+def test_watch_directories(tmp_path):
+    watched = tmp_path / "watched"
+    watched.mkdir()
+    output = tmp_path / "output.lp"
+    kwargs = cli.make_context(
+        "cli",
+        [str(watched), "--watch", "--measurement", "m", "--output", str(output)]
+        + ["--timestamp-column", "ts", "--poll-interval", "0.01"]
+        + ["--failed-dir", str(tmp_path / "failed")],
+    ).params
+    stop = threading.Event()
+    thread = threading.Thread(
+        target=watch_directories, args=([str(watched)], kwargs, stop)
+    )
+    thread.start()
+    try:
+        (watched / "first.csv").write_text("ts,a\n1,2\n")
+        (watched / "broken.csv").write_text("a,b\n1,2\n")
+        (watched / "ignored.txt").write_text("ts,a\n1,2\n")
+        wait_for(lambda: (tmp_path / "failed" / "broken.csv").exists())
+        (watched / "second.csv").write_text("ts,a\n3,4\n")
+        wait_for(lambda: (watched / "done" / "second.csv").exists())
+    finally:
+        stop.set()
+        thread.join()
+    assert sorted(os.listdir(watched)) == ["done", "ignored.txt"]
+    assert sorted(os.listdir(watched / "done")) == ["first.csv", "second.csv"]
+    assert os.listdir(tmp_path / "failed") == ["broken.csv"]
+    assert output.read_text() == (
+        "m ts=1.0,a=2.0 1000000000\nm ts=3.0,a=4.0 3000000000\n"
+    )
+
+
+def test_write_files_stops_followers(tmp_path):
+    csv_paths = [tmp_path / "first.csv", tmp_path / "second.csv"]
+    for index, csv_path in enumerate(csv_paths):
+        csv_path.write_text("ts,a\n{index},2\n".format(index=index))
+    output = tmp_path / "output.lp"
+    kwargs = cli.make_context(
+        "cli",
+        [str(csv_path) for csv_path in csv_paths]
+        + ["--follow", "--parallel-files", "2", "--measurement", "m"]
+        + ["--output", str(output), "--timestamp-column", "ts"]
+        + ["--poll-interval", "0.01"],
+    ).params
+    stop = threading.Event()
+    thread = threading.Thread(
+        target=write_files, args=([str(path) for path in csv_paths], kwargs, stop)
+    )
+    thread.start()
+    try:
+        time.sleep(0.1)
+    finally:
+        stop.set()
+        thread.join(5)
+    assert not thread.is_alive()
+    assert sorted(output.read_text().splitlines()) == [
+        "m ts=0.0,a=2.0 0",
+        "m ts=1.0,a=2.0 1000000000",
+    ]
+
+
+def test_reorder_buffer():
+    batches = []
+    batch_writer = BatchWriter(lambda payload, count: batches.append(payload), 100)
+    reorder = ReorderBuffer(batch_writer.add, batch_writer.flush, 4, 10)
+    positions = iter(range(1, 100))
+    source = reorder.track(lambda: next(positions), 0)
+    for series_key, timestamp in [("b", 12), ("a", 11), ("b", 3), ("a", 5)]:
+        assert source() == 0
+        reorder.add(series_key.encode("ascii"), b"v=1", timestamp)
+    assert source() == 1
+    reorder.add(b"a", b"v=1", 13)
+    reorder.flush()
+    assert source() == 2
+    batch_writer.close()
+    assert batches == [
+        b"a v=1 5\nb v=1 3\n",
+        b"a v=1 11\nb v=1 12\na v=1 13\n",
+    ]
+
+
+def test_reorder_buffer_splits_weeks_on_mondays():
+    batches = []
+    batch_writer = BatchWriter(lambda payload, count: batches.append(payload), 100)
+    reorder = ReorderBuffer(batch_writer.add, batch_writer.flush, 10, 604800, 10**9)
+    # Wed 23:00 and Thu 00:00, Sun 23:00 and Mon 00:00 of the first week of 2024
+    for moment in ["2024-01-03 23:00", "2024-01-04 00:00"] + [
+        "2024-01-07 23:00",
+        "2024-01-08 00:00",
+    ]:
+        parsed = timezone("UTC").localize(datetime.strptime(moment, "%Y-%m-%d %H:%M"))
+        reorder.add(b"m", b"v=1", int(parsed.timestamp()))
+    reorder.flush()
+    batch_writer.close()
+    assert batches == [
+        b"m v=1 1704322800\nm v=1 1704326400\nm v=1 1704668400\n",
+        b"m v=1 1704672000\n",
+    ]
+
+
+def test_reorder_buffer_keeps_points_without_timestamp_in_order():
+    batches = []
+    batch_writer = BatchWriter(lambda payload, count: batches.append(payload), 100)
+    reorder = ReorderBuffer(batch_writer.add, batch_writer.flush, 5, 10)
+    for series_key, timestamp in [("b", None), ("c", 4), ("a", None), ("b", 3)]:
+        reorder.add(series_key.encode("ascii"), b"v=1", timestamp)
+    reorder.add(b"c", b"v=1", None)
+    batch_writer.close()
+    assert batches == [b"b v=1\na v=1\nc v=1\nb v=1 3\nc v=1 4\n"]
+
+
+@pytest.mark.parametrize(
+    "duration,expected",
+    [("1h", 3600 * 10**9), ("7d", 7 * 24 * 3600 * 10**9), ("500ms", 5 * 10**8)],
+)
+def test_parse_duration(duration, expected):
+    assert parse_duration(duration) == expected
+
+
+@pytest.mark.parametrize("duration", ["", "0d", "1y", "d", "1.5h"])
+def test_parse_duration_invalid(duration):
+    with pytest.raises(ValueError):
+        parse_duration(duration)
+
+
+def test_write_data_reorders_points(tmp_path):
+    day = 86400 * 10**9
+    csv_path = tmp_path / "reorder.csv"
+    csv_path.write_text(
+        "device,ts,v\n"
+        "b,2,1\na,1,2\nb,1,3\na,{a},4\nb,{b},5\n".format(a=day + 1, b=day)
+    )
+    output = tmp_path / "output.lp"
+    csv_importer = CsvImporter(str(csv_path))
+    csv_importer.set_measurement("m")
+    csv_importer.set_tags_columns("device")
+    csv_importer.set_timestamp_column("ts")
+    csv_importer.set_timestamp_format("raw")
+    csv_importer.set_column_ignorelist("ts")
+    csv_importer.set_reorder_window(10)
+    csv_importer.set_shard_duration("1d")
+    csv_importer.set_output(str(output))
+    csv_importer.set_output_chunk_lines(3)
+    csv_importer.write_data()
+    assert [path.read_text() for path in sorted(tmp_path.glob("output-*.lp"))] == [
+        'm,device=a v="2" 1\nm,device=b v="3" 1\nm,device=b v="1" 2\n',
+        'm,device=a v="4" {a}\nm,device=b v="5" {b}\n'.format(a=day + 1, b=day),
+    ]
+
+
+def test_stats():
+    stats = Stats()
+    assert stats.timed("conversion", float)("1.5") == 1.5
+    with pytest.raises(ValueError):
+        stats.timed("timestamp", int)("x")
+    assert list(stats.timed_iter("read", [["a"], ["b"]])) == [["a"], ["b"]]
+    assert stats.seconds["conversion"] > 0
+    assert stats.seconds["timestamp"] > 0
+    assert stats.seconds["read"] > 0
+    for latency in range(1, 101):
+        stats.record_batch(latency / 100.0)
+    assert stats.percentile(50) == 0.5
+    assert stats.percentile(99) == 0.99
+    assert stats.percentile(100) == 1.0
+    stats.merge({"network": 1.0}, skipped_count=2, failed_count=1)
+    assert stats.seconds["network"] == pytest.approx(51.5)
+    report = stats.report(100, 2.0)
+    assert "100 written, 2 skipped, 1 failed" in report
+    assert "50 measurements/s" in report
+    assert "p50 0.500s, p90 0.900s, p99 0.990s, max 1.000s of 100 batches" in report
+
+
+def test_progress():
+    stream = io.StringIO()
+    progress = Progress("test.csv", interval=3600, stream=stream)
+    progress.update(1000)
+    progress.finish()
+    assert stream.getvalue() == ""
+    progress.interval = 0
+    progress.update(2000)
+    progress.finish()
+    assert stream.getvalue().startswith("\rtest.csv: 2000 measurements (")
+    assert stream.getvalue().endswith(" measurements/s)\n")
+
+
+def test_write_data_with_stats(tmp_path, capsys):
+    csv_importer = CsvImporter(os.path.join(FIXTURES_DIR, "simple.csv"))
+    csv_importer.set_measurement("m")
+    csv_importer.set_output(str(tmp_path / "export.lp"))
+    csv_importer.set_stats(True)
+    csv_importer.write_data()
+    output = capsys.readouterr().out
+    assert "2 written, 0 skipped, 0 failed" in output
+    assert "of 1 batches" in output
+    for stage in Stats.STAGES:
+        assert "Stage {stage}".format(stage=stage) in output
+
+
+def test_metrics():
+    metrics = Metrics()
+    assert list(metrics.counted_iter([["a"], ["b"]])) == [["a"], ["b"]]
+    metrics.observe_write(10, 100, 0.02)
+    metrics.observe_write(5, 50, 20.0)
+    metrics.inc("write_retries")
+    text = metrics.render()
+    assert "csvimporter_rows_read_total 2\n" in text
+    assert "csvimporter_points_written_total 15\n" in text
+    assert "csvimporter_bytes_sent_total 150\n" in text
+    assert "csvimporter_write_retries_total 1\n" in text
+    assert "# TYPE csvimporter_queue_depth gauge\n" in text
+    assert 'csvimporter_write_latency_seconds_bucket{le="0.01"} 0\n' in text
+    assert 'csvimporter_write_latency_seconds_bucket{le="0.025"} 1\n' in text
+    assert 'csvimporter_write_latency_seconds_bucket{le="10"} 1\n' in text
+    assert 'csvimporter_write_latency_seconds_bucket{le="+Inf"} 2\n' in text
+    assert "csvimporter_write_latency_seconds_count 2\n" in text
+
+
+def test_metrics_counts_rows_of_parallel_files():
+    metrics = Metrics()
+    threads = [
+        threading.Thread(target=lambda: list(metrics.counted_iter([["a"]] * 50000)))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert metrics.values["rows_read"] == 200000
+
+
+def test_metrics_endpoint():
+    metrics = Metrics()
+    metrics.start(port=0)
+    try:
+        assert metrics.server.server_address[0] == "127.0.0.1"
+        url = "http://127.0.0.1:{port}/metrics".format(port=metrics.server.server_port)
+        with urllib.request.urlopen(url) as response:
+            assert b"csvimporter_points_written_total 0" in response.read()
+    finally:
+        metrics.stop()
+
+
+def test_write_data_exports_metrics(tmp_path):
+    path = str(tmp_path / "metrics.prom")
+    csv_importer = CsvImporter(os.path.join(FIXTURES_DIR, "simple.csv"))
+    csv_importer.set_measurement("m")
+    csv_importer.set_output(str(tmp_path / "export.lp"))
+    csv_importer.set_metrics_file(path)
+    csv_importer.write_data()
+    with open(path) as metrics_file:
+        text = metrics_file.read()
+    assert "csvimporter_rows_read_total 2\n" in text
+    assert "csvimporter_points_written_total 2\n" in text
+    assert "csvimporter_batches_written_total 1\n" in text
+    assert "csvimporter_queue_depth 0\n" in text
+
+
+def test_pickle_configured_importer(tmp_path):
+    csv_importer = CsvImporter(os.path.join(FIXTURES_DIR, "simple.csv"))
+    csv_importer.set_server("localhost")
+    csv_importer.set_port("8086")
+    csv_importer.set_measurement("m")
+    csv_importer.set_output(str(tmp_path / "export.lp"))
+    csv_importer.set_stats(True)
+    csv_importer.set_metrics_port(0)
+    csv_importer.set_adaptive_batch_size(True)
+    csv_importer.set_follow(True)
+    csv_importer.connect()
+    csv_importer.open_output()
+    batch_writer = csv_importer.create_batch_writer()
+    try:
+        copy = pickle.loads(pickle.dumps(csv_importer))
+    finally:
+        batch_writer.close()
+        csv_importer.close_output()
+        csv_importer.metrics.stop()
+    for name in ("influxdb_connection", "output_file", "stats", "metrics"):
+        assert getattr(copy, name) is None
+    assert copy.cfg_output == csv_importer.cfg_output
+    assert list(copy.compile_plan().transform(copy.read_records())) == list(
+        csv_importer.compile_plan().transform(csv_importer.read_records())
+    )
+
+
+def test_resume_position_of_compressed_file(tmp_path):
+    csv_path = tmp_path / "compressed.csv.gz"
+    with gzip.open(csv_path, "wt") as csv_file:
+        csv_file.write("ts,a\n" + "1,2\n" * 10000)
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.json"))
+    recorded = {"offset": 20005, "line": 5001}
+    checkpoint.positions[Checkpoint.key(str(csv_path))] = recorded
+    csv_importer = CsvImporter(str(csv_path))
+    assert recorded["offset"] > os.path.getsize(csv_path)
+    assert csv_importer.resume_position(checkpoint) == recorded
+
+
+def test_write_data_ignores_checkpoint_of_replaced_file(tmp_path):
+    csv_path = tmp_path / "dev1.csv"
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+    written = []
+    for index, rows in enumerate([range(1, 4), range(4, 9)]):
+        csv_path.write_text("ts,a\n" + "".join("%d,1\n" % row for row in rows))
+        output = tmp_path / "output{index}.lp".format(index=index)
+        csv_importer = CsvImporter(str(csv_path))
+        csv_importer.set_measurement("m")
+        csv_importer.set_output(str(output))
+        csv_importer.set_checkpoint(checkpoint_path)
+        csv_importer.write_data()
+        written.append(len(output.read_text().splitlines()))
+    assert written == [3, 5]
+    assert Checkpoint(checkpoint_path).position(str(csv_path))["line"] == 6
+
+
+def test_watch_directories_fails_corrupt_files(tmp_path):
+    watched = tmp_path / "watched"
+    watched.mkdir()
+    output = tmp_path / "output.lp"
+    kwargs = cli.make_context(
+        "cli",
+        [str(watched), "--watch", "--measurement", "m", "--output", str(output)]
+        + ["--timestamp-column", "ts", "--poll-interval", "0.01"]
+        + ["--failed-dir", str(tmp_path / "failed")],
+    ).params
+    (watched / "bad.csv.gz").write_bytes(b"\x1f\x8b\x08\x00" + os.urandom(64))
+    (watched / "truncated.csv.xz").write_bytes(lzma.compress(b"ts,a\n1,2\n")[:20])
+    stop = threading.Event()
+    thread = threading.Thread(
+        target=watch_directories, args=([str(watched)], kwargs, stop)
+    )
+    thread.start()
+    try:
+        wait_for(lambda: os.listdir(watched) == [])
+        (watched / "good.csv").write_text("ts,a\n1,2\n")
+        wait_for(lambda: (watched / "done" / "good.csv").exists())
+    finally:
+        stop.set()
+        thread.join()
+    assert sorted(os.listdir(tmp_path / "failed")) == [
+        "bad.csv.gz",
+        "truncated.csv.xz",
+    ]
+    assert output.read_text() == "m ts=1.0,a=2.0 1000000000\n"
+
+
+def test_watch_directories_forgets_checkpoint_of_moved_files(tmp_path):
+    watched = tmp_path / "watched"
+    watched.mkdir()
+    output = tmp_path / "output.lp"
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+    kwargs = cli.make_context(
+        "cli",
+        [str(watched), "--watch", "--measurement", "m", "--output", str(output)]
+        + ["--timestamp-column", "ts", "--poll-interval", "0.01"]
+        + ["--checkpoint", checkpoint_path],
+    ).params
+    stop = threading.Event()
+    thread = threading.Thread(
+        target=watch_directories, args=([str(watched)], kwargs, stop)
+    )
+    thread.start()
+    try:
+        (watched / "dev1.csv").write_text("ts,a\n1,1\n2,1\n3,1\n")
+        wait_for(lambda: (watched / "done" / "dev1.csv").exists())
+        (watched / "dev1.csv").write_text("ts,a\n4,1\n5,1\n6,1\n7,1\n8,1\n")
+        wait_for(lambda: (watched / "done" / "dev1.csv.1").exists())
+    finally:
+        stop.set()
+        thread.join()
+    assert len(output.read_text().splitlines()) == 8
+    assert Checkpoint(checkpoint_path).positions == {}
+
+
+def test_checkpoint_records_batches_in_order(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    checkpoint = Checkpoint(path, interval=0)
+    checkpoint.begin(1, {"a": {"offset": 10, "line": 1}})
+    checkpoint.begin(2, {"a": {"offset": 20, "line": 2}})
+    checkpoint.begin(3, {"b": {"offset": 30, "line": 3}})
+    checkpoint.acknowledge(2)
+    assert checkpoint.positions == {}
+    checkpoint.acknowledge(1)
+    assert checkpoint.positions == {"a": {"offset": 20, "line": 2}}
+    checkpoint.acknowledge(3)
+    assert Checkpoint(path).positions == {
+        "a": {"offset": 20, "line": 2},
+        "b": {"offset": 30, "line": 3},
+    }
+
+
+@pytest.mark.parametrize(
+    "measurement,tags,expected",
+    [
+        ("simple", {}, b"simple"),
+        ("with space,comma", {"t 1": "v,1"}, b"with\\ space\\,comma,t\\ 1=v\\,1"),
+        ("m", {"z": "1", "a": "2"}, b"m,a=2,z=1"),
+        ("m", {"empty": "", "none": None}, b"m"),
+        ("m", {"tag": "trailing\\"}, b"m,tag=trailing\\\\ "),
+    ],
+)
+def test_line_protocol_encoder_series_key(measurement, tags, expected):
+    encoder = LineProtocolEncoder(measurement, list(tags))
+    tag_values = [tags[column] for column in encoder.tag_columns]
+    assert encoder.series_key(tag_values) == expected
+
+
+def test_line_protocol_encoder_series_key_cache():
+    encoder = LineProtocolEncoder("m", ["tag"], cache_size=2)
+    for value in ["a", "b", "a", "c", "b", "a"]:
+        assert encoder.series_key([value]) == b"m,tag=" + value.encode("ascii")
+    cache_info = encoder.cached_series_key.cache_info()
+    assert (cache_info.hits, cache_info.misses, cache_info.currsize) == (1, 5, 2)
+
+
+def test_write_data_logs_series_key_cache(tmp_path, caplog):
+    csv_importer = CsvImporter(os.path.join(FIXTURES_DIR, "simple.csv"))
+    csv_importer.set_measurement("m")
+    csv_importer.set_tags_columns("col1")
+    csv_importer.set_output(str(tmp_path / "output.lp"))
+    with caplog.at_level(logging.DEBUG):
+        csv_importer.write_data()
+    assert "Series key cache of" in caplog.text
+    assert "of 10000 series keys" in caplog.text
+
+
+@pytest.mark.parametrize(
+    "value,expected",
+    [
+        ("x", b'"x"'),
+        ('say "hi"', b'"say \\"hi\\""'),
+        ("slash\\", b'"slash\\\\"'),
+        (-1.5, b"-1.5"),
+        (3, b"3i"),
+        (True, b"true"),
+        (False, b"false"),
+    ],
+)
+def test_line_protocol_encoder_encode_value(value, expected):
+    assert LineProtocolEncoder.encode_value(value) == expected
+
+
+def test_line_protocol_encoder_to_nanoseconds():
+    timestamp = datetime(2016, 9, 2, 8, 0, 11, tzinfo=timezone("UTC"))
+    assert LineProtocolEncoder.to_nanoseconds(timestamp) == 1472803211000000000
+
+
+@pytest.mark.parametrize(
+    "options,expected",
+    [
+        ({}, [(b"m", b'tag="x",a="1",b="",ts="10"', None)]),
+        (
+            {"convert_int_to_float": True},
+            [(b"m", b'tag="x",a=1.0,ts=10.0', None)],
+        ),
+        (
+            {"timestamp_column": "ts", "timestamp_converter": int},
+            [(b"m", b'tag="x",a="1",b="",ts="10"', 10)],
+        ),
+        (
+            {"column_ignorelist": ["b", "ts"], "tags_columns": ["tag"]},
+            [(b"m,tag=x", b'a="1"', None)],
+        ),
+        (
+            {"column_ignorelist": ["a", "b", "ts"], "tags_columns": ["tag"]},
+            [],
+        ),
+        (
+            {
+                "timestamp_column": "ts",
+                "timestamp_converter": int,
+                "date_filter": lambda timestamp: timestamp != 10,
+            },
+            [],
+        ),
+    ],
+)
+def test_row_plan(options, expected):
+    encoder = LineProtocolEncoder("m", options.pop("tags_columns", None))
+    plan = RowPlan(["tag", "a", "b", "ts"], encoder, **options)
+    assert list(plan.transform([["x", "1", "", "10"], []])) == expected
+    assert plan.skipped_count == 1 - len(expected)
+
+
+def test_columnar_row_plan():
+    encoder = LineProtocolEncoder("m", ["tag"])
+    plan = ColumnarRowPlan(
+        ["tag", "num", "text", "mixed", "ts"],
+        encoder,
+        timestamp_column="ts",
+        timestamp_converter=int,
+        column_ignorelist=["ts"],
+        convert_int_to_float=True,
+        chunk_rows=2,
+    )
+    plan.thousands_sep = "."
+    plan.decimal_point = ","
+    rows = [
+        ["x", "1.000,5", "a", "1", "10"],
+        ["y", "", "b", "c", "20"],
+        ["x", "2", "c", "d", "bad"],
+        ["x", "1e3", "1", "", "30"],
+        ["", "", "", "", "40"],
+    ]
+    positions = iter(range(100))
+    points = list(plan.transform(rows, lambda: next(positions)))
+    assert points == [
+        (b"m,tag=x", b'num=1000.5,text="a",mixed=1.0', 10),
+        (b"m,tag=y", b'text="b",mixed="c"', 20),
+        (b"m,tag=x", b'num=1e3,text="1"', 30),
+    ]
+    assert plan.string_indices == {2}
+    assert plan.failed_count == 1
+    assert plan.skipped_count == 1
+    assert plan.position == 3
+
+
+@pytest.mark.parametrize("convert_int_to_float", [True, False])
+def test_columnar_row_plan_with_multiline_cell(convert_int_to_float, tmp_path):
+    csv_path = tmp_path / "multiline.csv"
+    csv_path.write_text('time,a,b\n1,"1\n2",10\n2,3,20\n3,4,30\n')
+    csv_importer = CsvImporter(str(csv_path))
+    csv_importer.set_measurement("m")
+    csv_importer.set_timestamp_column("time")
+    csv_importer.set_timestamp_format("raw")
+    csv_importer.set_column_ignorelist("time")
+    csv_importer.set_convert_int_to_float(convert_int_to_float)
+    csv_importer.set_engine("columnar")
+    points = list(csv_importer.compile_plan().transform(csv_importer.read_records()))
+    assert [field_set.split(b",")[0] for _, field_set, _ in points] == [
+        b'a="1\\n2"',
+        b"a=3.0" if convert_int_to_float else b'a="3"',
+        b"a=4.0" if convert_int_to_float else b'a="4"',
+    ]
+
+
+def test_columnar_row_plan_matches_row_plan():
+    csv_importer = CsvImporter(
+        os.path.join(FIXTURES_DIR, "winterzeit.dta.csv"), delimiter=";"
+    )
+    csv_importer.set_measurement("m")
+    csv_importer.set_tags_columns("ASD")
+    csv_importer.set_timestamp_column("Zeitstempel")
+    expected = list(csv_importer.compile_plan().transform(csv_importer.read_records()))
+    csv_importer.set_engine("columnar")
+    plan = csv_importer.compile_plan()
+    assert isinstance(plan, ColumnarRowPlan)
+    assert list(plan.transform(csv_importer.read_records())) == expected
+
+
+def test_columnar_row_plan_times_conversion_once(tmp_path):
+    schema_path = tmp_path / "schema.json"
+    schema_path.write_text('{"ok": "boolean"}')
+    csv_path = tmp_path / "columns.csv"
+    csv_path.write_text("ok,v\ntrue,1.5\nfalse,2\nT,3\n")
+    csv_importer = CsvImporter(str(csv_path))
+    csv_importer.set_measurement("m")
+    csv_importer.set_schema(str(schema_path))
+    csv_importer.set_convert_int_to_float(True)
+    csv_importer.set_engine("columnar")
+    conversions = []
+
+    class CountingSeconds(dict):
+        def __setitem__(self, stage, seconds):
+            if stage == "conversion":
+                conversions.append(seconds)
+            super().__setitem__(stage, seconds)
+
+    stats = Stats()
+    stats.seconds = CountingSeconds(stats.seconds)
+    plan = csv_importer.compile_plan(stats)
+    assert len(list(plan.transform(csv_importer.read_records()))) == 3
+    # One timed call per column of the chunk
+    assert len(conversions) == 2
+
+
+def test_infer_schema(tmp_path):
+    csv_path = tmp_path / "schema.csv"
+    csv_path.write_text(
+        "host,ts,temp,count,ok,name,extra\n"
+        "a,1600000000,1.5,3,true,x,\n"
+        "b,1600000001,2,4,false,y,\n"
+        "c,1600000002,oops,5,T,z,\n"
+    )
+    schema_path = tmp_path / "schema.json"
+    schema_path.write_text('{"temp": "float", "name": "tag", "missing": "string"}')
+    csv_importer = CsvImporter(str(csv_path))
+    csv_importer.set_tags_columns("host")
+    csv_importer.set_timestamp_column("ts")
+    samples = csv_importer.sample_records()
+    assert list(csv_importer.infer_schema(samples).items()) == [
+        ("host", "tag"),
+        ("ts", "timestamp"),
+        ("temp", "string"),
+        ("count", "integer"),
+        ("ok", "boolean"),
+        ("name", "string"),
+        ("extra", "string"),
+    ]
+    csv_importer.set_schema(str(schema_path))
+    csv_importer.set_convert_int_to_float(True)
+    schema = csv_importer.infer_schema(samples)
+    assert schema["temp"] == "float"
+    assert schema["count"] == "float"
+    assert schema["name"] == "tag"
+    assert "missing" not in schema
+
+
+def test_infer_schema_keeps_explicit_integers(tmp_path):
+    schema_path = tmp_path / "schema.json"
+    schema_path.write_text('{"col1": "integer"}')
+    csv_path = tmp_path / "integers.csv"
+    csv_path.write_text("col1,col2\n1,2\n")
+    csv_importer = CsvImporter(str(csv_path))
+    csv_importer.set_schema(str(schema_path))
+    csv_importer.set_convert_int_to_float(True)
+    schema = csv_importer.infer_schema(csv_importer.sample_records())
+    assert list(schema.items()) == [("col1", "integer"), ("col2", "float")]
+
+
+def test_infer_schema_invalid_type(tmp_path):
+    schema_path = tmp_path / "schema.json"
+    schema_path.write_text('{"col1": "number"}')
+    csv_importer = CsvImporter(os.path.join(FIXTURES_DIR, "simple.csv"))
+    csv_importer.set_schema(str(schema_path))
+    with pytest.raises(ValueError):
+        csv_importer.infer_schema([])
+
+
+@pytest.mark.parametrize("engine", ["row", "columnar"])
+def test_schema_pins_field_types(engine, tmp_path):
+    csv_path = tmp_path / "schema.csv"
+    csv_path.write_text(
+        "host,temp,count,ok,name\n"
+        "a,1.5,3,true,x\n"
+        "b,oops,4.5,F,\n"
+        "c,2,5,maybe,7\n"
+    )
+    schema_path = tmp_path / "schema.json"
+    schema_path.write_text(
+        '{"temp": "float", "count": "integer", "ok": "boolean", "name": "string"}'
+    )
+    csv_importer = CsvImporter(str(csv_path))
+    csv_importer.set_measurement("m")
+    csv_importer.set_tags_columns("host")
+    csv_importer.set_schema(str(schema_path))
+    csv_importer.set_engine(engine)
+    plan = csv_importer.compile_plan()
+    points = list(plan.transform(csv_importer.read_records()))
+    assert [(series_key, field_set) for series_key, field_set, _ in points] == [
+        (b"m,host=a", b'temp=1.5,count=3i,ok=true,name="x"'),
+        (b"m,host=b", b"ok=false"),
+        (b"m,host=c", b'temp=2.0,count=5i,name="7"'),
+    ]
+
+
+@pytest.mark.parametrize(
+    "field_type,value,expected",
+    [
+        ("integer", "42", b"42i"),
+        ("integer", "-9007199254740993", b"-9007199254740993i"),
+        ("integer", "9223372036854775808", None),
+        ("integer", "1.5", None),
+        ("boolean", "TRUE", b"true"),
+        ("boolean", "f", b"false"),
+        ("boolean", "yes", None),
+        ("float", "1", b"1.0"),
+        ("float", "x", None),
+        ("string", "x", b'"x"'),
+        ("string", "", None),
+    ],
+)
+def test_typed_field_converter(field_type, value, expected):
+    assert RowPlan.typed_field_converter(field_type, "col")(value) == expected
+
+
+@pytest.mark.parametrize("engine", ["row", "columnar"])
+def test_native_integer_and_boolean_fields(engine, tmp_path):
+    csv_path = tmp_path / "types.csv"
+    csv_path.write_text(
+        "counter,ok,ratio\n9007199254740993,true,0.5\n12,False,1\n,t,\n"
+    )
+    csv_importer = CsvImporter(str(csv_path))
+    csv_importer.set_measurement("m")
+    csv_importer.set_convert_int_to_float(False)
+    csv_importer.set_engine(engine)
+    plan = csv_importer.compile_plan()
+    assert [
+        field_set for _, field_set, _ in plan.transform(csv_importer.read_records())
+    ] == [
+        b"counter=9007199254740993i,ok=true,ratio=0.5",
+        (
+            b"counter=12i,ok=false,ratio=1"
+            if engine == "columnar"
+            else b"counter=12i,ok=false,ratio=1.0"
+        ),
+        b"ok=true",
+    ]
+
+
+@pytest.mark.parametrize(
+    "paths,expected",
+    [
+        (["simple.csv"], ["simple.csv"]),
+        (["."], ["./simple.csv", "./sommerzeit.dta.csv", "./winterzeit.dta.csv"]),
+        (["*.dta.csv"], ["sommerzeit.dta.csv", "winterzeit.dta.csv"]),
+        (["w*.csv", "simple.csv"], ["winterzeit.dta.csv", "simple.csv"]),
+        (["nothing*.csv"], []),
+    ],
+)
+def test_expand_paths(paths, expected, monkeypatch):
+    monkeypatch.chdir(FIXTURES_DIR)
+    assert expand_paths(paths) == expected
+
+
+def test_expand_paths_missing(monkeypatch):
+    monkeypatch.chdir(FIXTURES_DIR)
+    with pytest.raises(click.BadParameter):
+        expand_paths(["missing.csv"])
+
+
+def compress_zstd(data):
+    zstandard = pytest.importorskip("zstandard")
+    return zstandard.compress(data)
+
+
+@pytest.mark.parametrize(
+    "compression,extension,compress",
+    [
+        ("gzip", ".csv.gz", gzip.compress),
+        ("bz2", ".csv.bz2", bz2.compress),
+        ("xz", ".csv.xz", lzma.compress),
+        ("zstd", ".csv.zst", compress_zstd),
+    ],
+)
+def test_compressed_csv(compression, extension, compress, tmp_path):
+    with open(os.path.join(FIXTURES_DIR, "winterzeit.dta.csv"), "rb") as csv_file:
+        data = csv_file.read()
+    path = str(tmp_path / ("winterzeit" + extension))
+    with open(path, "wb") as compressed_file:
+        compressed_file.write(compress(data))
+    assert detect_compression(path) == compression
+    with open_csv(path, compression, start=1000) as csv_file:
+        assert csv_file.read() == data[1000:]
+    csv_importer = CsvImporter(path, ";")
+    plain_importer = CsvImporter(os.path.join(FIXTURES_DIR, "winterzeit.dta.csv"), ";")
+    assert csv_importer.csv_header == plain_importer.csv_header
+    assert list(csv_importer.read_records()) == list(plain_importer.read_records())
+    assert list(csv_importer.read_rows()) == list(plain_importer.read_rows())
+    assert expand_paths([str(tmp_path)]) == [path]
+
+
+def test_detect_compression_of_empty_files(tmp_path):
+    path = tmp_path / "empty.csv.gz"
+    path.touch()
+    assert detect_compression(str(path)) == "gzip"
+    assert detect_compression(os.path.join(FIXTURES_DIR, "simple.csv")) is None
+
+
 class TestClass(object):
     @classmethod
     def setup_class(cls):
@@ -195,6 +1412,16 @@ class TestClass(object):
         self.actual.set_timestamp_format(expected)
         assert self.actual.cfg_timestamp_format == expected
 
+    def test_set_timestamp_strptime(self):
+        expected = "%Y-%m-%d %H:%M:%S"
+        self.actual.set_timestamp_strptime(expected)
+        assert self.actual.cfg_timestamp_strptime == expected
+
+    def test_set_sample_rows(self):
+        expected = 100
+        self.actual.set_sample_rows("100")
+        assert self.actual.cfg_sample_rows == expected
+
     @pytest.mark.parametrize("tz", ["UTC", "Europe/Berlin", "US/Eastern"])
     def test_set_timestamp_timezone(self, tz):
         expected = tz
@@ -227,6 +1454,82 @@ class TestClass(object):
         self.actual.set_column_ignorelist(columns)
         assert self.actual.cfg_column_ignorelist == expected
 
+    def test_set_batch_size(self):
+        expected = 1000
+        self.actual.set_batch_size("1000")
+        assert self.actual.cfg_batch_size == expected
+
+    def test_set_write_concurrency(self):
+        expected = 4
+        self.actual.set_write_concurrency("4")
+        assert self.actual.cfg_write_concurrency == expected
+
+    def test_set_batch_max_age(self):
+        expected = 2.5
+        self.actual.set_batch_max_age("2.5")
+        assert self.actual.cfg_batch_max_age == expected
+
+    def test_set_max_retries(self):
+        expected = 3
+        self.actual.set_max_retries("3")
+        assert self.actual.cfg_max_retries == expected
+
+    def test_set_gzip_level(self):
+        expected = 9
+        self.actual.set_gzip_level("9")
+        assert self.actual.cfg_gzip_level == expected
+
+    def test_set_pool_size(self):
+        expected = 16
+        self.actual.set_pool_size("16")
+        assert self.actual.cfg_pool_size == expected
+
+    def test_set_retry_backoff(self):
+        expected = 0.25
+        self.actual.set_retry_backoff("0.25")
+        assert self.actual.cfg_retry_backoff == expected
+
+    def test_set_engine(self):
+        expected = "columnar"
+        self.actual.set_engine(expected)
+        assert self.actual.cfg_engine == expected
+
+    def test_set_precision(self):
+        expected = "ms"
+        self.actual.set_precision(expected)
+        assert self.actual.cfg_precision == expected
+        assert self.actual.write_precision == expected
+
+    def test_set_precision_invalid(self):
+        with pytest.raises(ValueError):
+            self.actual.set_precision("h")
+
+    def test_set_series_cache_size(self):
+        expected = 500
+        self.actual.set_series_cache_size("500")
+        assert self.actual.cfg_series_cache_size == expected
+
+    def test_set_reorder_window(self):
+        expected = 10000
+        self.actual.set_reorder_window("10000")
+        assert self.actual.cfg_reorder_window == expected
+
+    def test_set_shard_duration(self):
+        expected = 24 * 3600 * 10**9
+        self.actual.set_shard_duration("1d")
+        assert self.actual.cfg_shard_duration == expected
+
+    def test_set_schema(self):
+        expected = "schema.json"
+        self.actual.set_schema(expected)
+        assert self.actual.cfg_schema == expected
+
+    @pytest.mark.parametrize("toggle", [True, False])
+    def test_set_infer_schema(self, toggle):
+        expected = toggle
+        self.actual.set_infer_schema(expected)
+        assert self.actual.cfg_infer_schema == expected
+
     @pytest.mark.parametrize("toggle", [True, False])
     def test_set_convert_int_to_float(self, toggle):
         expected = toggle
@@ -252,3 +1555,70 @@ class OutputTestCase(unittest.TestCase):
             '\n    {\n        "col1": "c",\n        "col2": "d"\n    }\n]'
         )
         assert self.actual.print_rows() == expected
+
+    def test_compile_plan(self):
+        self.actual.set_measurement("m")
+        self.actual.set_tags_columns("col1")
+        expected = [(b"m,col1=a", b'col2="b"', None), (b"m,col1=c", b'col2="d"', None)]
+        plan = self.actual.compile_plan()
+        assert list(plan.transform(self.actual.read_records())) == expected
+
+
+class ParallelTestCase(unittest.TestCase):
+    def setUp(self):
+        csv_file = "{fixtures_dir}/winterzeit.dta.csv".format(fixtures_dir=FIXTURES_DIR)
+        self.actual = CsvImporter(csv_file, ";")
+        self.actual.set_measurement("m")
+        self.actual.set_timestamp_column("Zeitstempel")
+        self.actual.set_tags_columns("ASD")
+
+    def tearDown(self):
+        del self.actual
+
+    def test_split_ranges(self):
+        ranges = list(self.actual.split_ranges(chunk_size=4096))
+        assert len(ranges) > 1
+        assert ranges[0][0] == self.actual.csv_header_end
+        records = []
+        for start, end in ranges:
+            records.extend(self.actual.read_records(start, end))
+        assert records == list(self.actual.read_records())
+
+    def test_transform_parallel(self):
+        self.actual.set_workers(3)
+        expected = list(
+            self.actual.compile_plan().transform(self.actual.read_records())
+        )
+        assert list(self.actual.transform_parallel(chunk_size=4096)) == expected
+
+    def test_write_data_resumes_from_checkpoint(self):
+        lines = []
+        failing = [True]
+
+        def send(payload, count):
+            if failing[0] and len(lines) >= 1000:
+                raise IOError("connection reset")
+            lines.extend(payload.splitlines())
+
+        with NamedTemporaryFile() as checkpoint_file:
+            checkpoint = Checkpoint(checkpoint_file.name)
+            batch_writer = BatchWriter(send, batch_size=100, checkpoint=checkpoint)
+            with pytest.raises(IOError):
+                try:
+                    self.actual.write_data(batch_writer)
+                finally:
+                    batch_writer.close()
+            assert len(lines) == 1000
+
+            failing[0] = False
+            checkpoint = Checkpoint(checkpoint_file.name)
+            batch_writer = BatchWriter(send, batch_size=100, checkpoint=checkpoint)
+            self.actual.write_data(batch_writer)
+            batch_writer.close()
+            expected = self.actual.compile_plan().transform(self.actual.read_records())
+            assert len(lines) == 2880
+            assert lines == [
+                b"%s %s %d" % (series_key, field_set, timestamp)
+                for series_key, field_set, timestamp in expected
+            ]
+            assert checkpoint.position(self.actual.csv_filename)["line"] == 2881